@@ -2,7 +2,7 @@ import streamlit as st
 import time
 from utils.document_processor import DocumentProcessor
 from utils.qa_engine import QAEngine
-from utils.ui_components import render_left_sidebar, render_chat_interface, render_file_upload_center
+from utils.ui_components import render_left_sidebar, render_chat_interface, render_corpus_center, render_file_upload_center
 import os
 
 # Page configuration
@@ -124,12 +124,22 @@ def initialize_session_state():
         st.session_state.document_processor = DocumentProcessor()
     if 'qa_engine' not in st.session_state:
         st.session_state.qa_engine = QAEngine()
+        # Start loading the model now so the first question skips the cold start
+        st.session_state.qa_engine.warm_model()
     if 'document_uploaded' not in st.session_state:
         st.session_state.document_uploaded = False
     if 'document_content' not in st.session_state:
         st.session_state.document_content = ""
+    if 'document_index' not in st.session_state:
+        st.session_state.document_index = None
+    if 'retrieval_mode' not in st.session_state:
+        st.session_state.retrieval_mode = "keyword"
     if 'processing_status' not in st.session_state:
         st.session_state.processing_status = ""
+    if 'ingest_job' not in st.session_state:
+        st.session_state.ingest_job = None
+    if 'corpus_mode' not in st.session_state:
+        st.session_state.corpus_mode = False
 
 def main():
     initialize_session_state()
@@ -142,7 +152,9 @@ def main():
     
     # Main chat interface
     st.markdown("### Chat with Your Financial Data")
-    if st.session_state.document_uploaded:
+    if st.session_state.corpus_mode:
+        render_corpus_center()
+    elif st.session_state.document_uploaded:
         render_chat_interface()
     else:
         st.markdown("""
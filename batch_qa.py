@@ -0,0 +1,197 @@
+"""Answer a list of questions over every document in a directory, without the Streamlit UI.
+
+Documents are parsed and indexed in worker processes; questions for each
+document are sent to Ollama as soon as it is ready, with bounded
+concurrency. One JSON object per answer is written to the output (stdout by
+default) as results arrive.
+
+Example:
+    python batch_qa.py filings/ --questions questions.txt --output answers.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from utils.answer_cache import AnswerCache, get_answer_cache
+from utils.document_processor import DocumentProcessor
+from utils.ollama_router import OllamaRouter, configured_urls
+from utils.qa_engine import QAEngine
+from utils.retriever import BM25Retriever
+from utils.scheduler import LLMScheduler
+from utils.spool import SpooledUpload
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.xlsx', '.xls')
+
+
+_processor = None
+
+
+def _parse_document(path: str, use_cache: bool) -> Dict[str, Any]:
+    # Runs in a worker process; each worker keeps one processor. Documents are
+    # already spread across processes, so PDFs are not split further
+    global _processor
+    if _processor is None:
+        _processor = DocumentProcessor(use_cache=use_cache, pdf_workers=1)
+
+    started = time.perf_counter()
+    try:
+        # Files on disk are mapped in place rather than read into memory
+        content, metadata = _processor.parse_document(SpooledUpload(path))
+    except Exception as e:
+        # One unreadable file is reported in its record, the rest of the batch carries on
+        return {'path': path, 'parse_error': str(e), 'parse_seconds': time.perf_counter() - started}
+    index = BM25Retriever.from_document(content) if content else None
+    return {
+        'path': path,
+        'content': content,
+        'metadata': metadata,
+        'index': index,
+        'parse_seconds': time.perf_counter() - started,
+    }
+
+
+def find_documents(directory: str, recursive: bool = False) -> List[str]:
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(SUPPORTED_EXTENSIONS))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def read_questions(args: argparse.Namespace) -> List[str]:
+    questions = list(args.question or [])
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return questions
+
+
+def answer_question(engine_options: Dict[str, Any], parsed: Dict[str, Any], question: str) -> Dict[str, Any]:
+    # A fresh engine per question: answers are independent and engines are not thread-safe
+    engine = QAEngine(**engine_options)
+    metadata = parsed['metadata']
+    started = time.perf_counter()
+    answer = engine.generate_response(
+        question,
+        parsed['content'],
+        retriever=parsed['index'],
+        tables=metadata.get('tables'),
+        document_id=metadata.get('content_hash', '')
+    )
+    return {
+        'file': parsed['path'],
+        'question': question,
+        'answer': answer,
+        'error': answer.startswith("❌"),
+        'parse_seconds': round(parsed['parse_seconds'], 3),
+        'answer_seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def write_record(output, record: Dict[str, Any]):
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+
+
+def run(args: argparse.Namespace, output) -> int:
+    questions = read_questions(args)
+    if not questions:
+        print("No questions given, use --question or --questions", file=sys.stderr)
+        return 2
+
+    paths = find_documents(args.directory, args.recursive)
+    if not paths:
+        print(f"No PDF or Excel files found in {args.directory}", file=sys.stderr)
+        return 2
+
+    # One router for every engine so in-flight counts balance the questions across nodes
+    urls = [url.strip() for url in args.ollama_url.split(',') if url.strip()]
+    engine_options = {
+        'model_name': args.model,
+        'router': OllamaRouter.from_urls(urls, pool_size=max(args.concurrency, 1)),
+        'answer_cache': get_answer_cache() if args.answer_cache else AnswerCache(),
+        'num_ctx': args.num_ctx,
+        # The concurrency limit lives in the scheduler; the thread pool only supplies waiters
+        'scheduler': LLMScheduler(max_concurrent=args.concurrency, max_waiting=len(paths) * len(questions)),
+    }
+
+    failures = 0
+    # Spawned, not forked, since the router and answer threads may hold locks when workers start
+    spawn = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.parse_workers, mp_context=spawn) as parse_pool, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as answer_pool:
+        parsing = {parse_pool.submit(_parse_document, path, args.document_cache): path for path in paths}
+        pending = set(parsing)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if future not in parsing:
+                        raise
+                    # The worker died or its result could not be sent back
+                    result = {'path': parsing[future], 'parse_error': str(e) or type(e).__name__,
+                              'parse_seconds': 0.0}
+
+                if 'answer' in result:
+                    failures += result['error']
+                    write_record(output, result)
+                elif 'parse_error' in result or not result['content']:
+                    failures += 1
+                    reason = result.get('parse_error') or "No text could be extracted from the document"
+                    write_record(output, {
+                        'file': result['path'],
+                        'error': True,
+                        'answer': f"❌ Error: {reason}",
+                        'parse_seconds': round(result['parse_seconds'], 3),
+                    })
+                else:
+                    # Questions for this document start while others are still parsing
+                    pending.update(
+                        answer_pool.submit(answer_question, engine_options, result, question)
+                        for question in questions
+                    )
+
+    return 1 if failures else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Answer questions over a directory of financial documents")
+    parser.add_argument('directory', help="Directory of PDF/Excel files")
+    parser.add_argument('-q', '--question', action='append', help="Question to ask (repeatable)")
+    parser.add_argument('--questions', help="File with one question per line")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Include subdirectories")
+    parser.add_argument('--model', default="gemma:2b")
+    parser.add_argument('--ollama-url', default=','.join(configured_urls()),
+                        help="Ollama endpoint, or several separated by commas (default: OLLAMA_URLS)")
+    parser.add_argument('--num-ctx', type=int, default=2048, help="Model context window in tokens")
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1,
+                        help="Processes parsing documents")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Generations sent to Ollama at once across all endpoints "
+                             "(OLLAMA_NUM_PARALLEL times the number of endpoints)")
+    parser.add_argument('--no-document-cache', dest='document_cache', action='store_false',
+                        help="Always re-parse documents")
+    parser.add_argument('--no-answer-cache', dest='answer_cache', action='store_false',
+                        help="Do not reuse answers from earlier runs")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            return run(args, output)
+    return run(args, sys.stdout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
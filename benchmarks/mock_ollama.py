@@ -0,0 +1,177 @@
+"""A local stand-in for Ollama's HTTP API, for offline benchmarks.
+
+Serves /api/tags, /api/generate (streaming and not) and /api/embeddings with
+configurable latency: a fixed delay before the first token (prompt
+evaluation) and a delay per generated token.
+
+    python -m benchmarks.mock_ollama --port 11500 --first-token 0.2 --per-token 0.01
+"""
+import argparse
+import hashlib
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+ANSWER = ("Based on the document, total revenue was $1,234,567.00 for the latest period, "
+          "up 12.5% on the previous year, while operating expenses rose to $845,000.00.")
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, models: Optional[List[str]] = None, first_token_delay: float = 0.05,
+                 per_token_delay: float = 0.005, answer: str = ANSWER, max_concurrent: int = 1):
+        super().__init__(('127.0.0.1', port), MockOllamaHandler)
+        self.models = models or ['gemma:2b', 'nomic-embed-text']
+        self.first_token_delay = first_token_delay
+        self.per_token_delay = per_token_delay
+        self.answer = answer
+        # Like a CPU-bound Ollama, only this many generations make progress at once
+        self.slots = threading.Semaphore(max_concurrent)
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> 'MockOllamaServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': name} for name in self.server.models]})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        self.server.requests += 1
+        if self.path == '/api/embeddings':
+            digest = hashlib.sha256(payload.get('prompt', '').encode('utf-8')).digest()
+            self._send_json({'embedding': [byte / 255.0 for byte in digest] * 24})
+        elif self.path == '/api/generate':
+            if payload.get('model') not in self.server.models:
+                self._send_json({'error': f"model '{payload.get('model')}' not found"}, 404)
+            elif 'prompt' not in payload:
+                # A request without a prompt only loads the model
+                self._send_json({'model': payload['model'], 'response': '', 'done': True})
+            else:
+                self._generate(payload)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def _generate(self, payload):
+        server = self.server
+        tokens = server.answer.split(' ')
+        num_predict = payload.get('options', {}).get('num_predict')
+        if num_predict:
+            tokens = tokens[:num_predict]
+        tokens = [token + ' ' for token in tokens[:-1]] + tokens[-1:]
+        prompt_tokens = len(payload['prompt']) // 4
+
+        with server.slots:
+            started = time.perf_counter()
+            if not self._evaluate_prompt(server.first_token_delay):
+                # Like Ollama, a client that hung up cancels its generation
+                return
+            final = {
+                'model': payload['model'], 'done': True, 'context': list(range(prompt_tokens + len(tokens))),
+                'prompt_eval_count': prompt_tokens, 'eval_count': len(tokens),
+                'prompt_eval_duration': int(server.first_token_delay * 1e9),
+                'eval_duration': int(server.per_token_delay * len(tokens) * 1e9),
+            }
+            if not payload.get('stream', True):
+                time.sleep(server.per_token_delay * len(tokens))
+                final.update(response=''.join(tokens), total_duration=int((time.perf_counter() - started) * 1e9))
+                self._send_json(final)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for token in tokens:
+                    time.sleep(server.per_token_delay)
+                    self._write_chunk({'model': payload['model'], 'response': token, 'done': False})
+                final.update(response='', total_duration=int((time.perf_counter() - started) * 1e9))
+                self._write_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+            except OSError:
+                self.close_connection = True
+
+    def _evaluate_prompt(self, seconds: float) -> bool:
+        """Sleep for the prompt evaluation, False as soon as the client disconnects"""
+        deadline = time.perf_counter() + seconds
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return True
+            readable, _, _ = select.select([self.connection], [], [], remaining)
+            if readable:
+                try:
+                    if not self.connection.recv(1, socket.MSG_PEEK):
+                        self.close_connection = True
+                        return False
+                except OSError:
+                    self.close_connection = True
+                    return False
+                # A pipelined request is waiting, not a hang-up
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+                return True
+
+    def _write_chunk(self, payload):
+        line = json.dumps(payload).encode('utf-8') + b"\n"
+        self.wfile.write(b"%x\r\n" % len(line) + line + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Ollama API")
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--first-token', type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument('--per-token', type=float, default=0.005, help="Seconds per generated token")
+    parser.add_argument('--parallel', type=int, default=1, help="Generations served at once")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(args.port, first_token_delay=args.first_token,
+                              per_token_delay=args.per_token, max_concurrent=args.parallel)
+    print(f"Mock Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Microbenchmarks and an offline end-to-end benchmark against the mock Ollama server.
+
+    python -m benchmarks.run                    # run and print results
+    python -m benchmarks.run --save-baseline    # store results in benchmarks/baseline.json
+    python -m benchmarks.run --compare          # fail if anything is slower than the baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from benchmarks.mock_ollama import MockOllamaServer
+from benchmarks.synthetic import SyntheticFile, make_document_text, make_pdf, make_workbook
+from utils.answer_cache import AnswerCache
+from utils.document_processor import DocumentProcessor
+from utils.ollama_client import OllamaClient
+from utils.qa_engine import QAEngine
+from utils.retriever import BM25Retriever
+from utils.scheduler import LLMScheduler
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    func()  # warm-up: imports, pools, caches that are not part of the steady state
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def micro_benchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    processor = DocumentProcessor(use_cache=False)
+    pdf = make_pdf(args.pages)
+    workbook = make_workbook(args.sheets, args.rows)
+    text = make_document_text(args.pages)
+    sheets = pd.read_excel(SyntheticFile('bench.xlsx', workbook), sheet_name=None)
+
+    engine = QAEngine(client=OllamaClient("http://127.0.0.1:9"), answer_cache=AnswerCache())
+    retriever = BM25Retriever.from_document(text)
+    context = "Previous conversation:\nQ1: What was revenue?\nA1: Revenue was $1.2M...\n\n"
+
+    return {
+        f'process_document_pdf_{args.pages}p': measure(
+            lambda: processor.process_document(SyntheticFile('bench.pdf', pdf)), args.repeat),
+        f'process_document_xlsx_{args.sheets}x{args.rows}': measure(
+            lambda: processor.process_document(SyntheticFile('bench.xlsx', workbook)), args.repeat),
+        'extract_financial_metrics': measure(
+            lambda: processor._extract_financial_metrics(text), args.repeat),
+        'extract_financial_metrics_from_excel': measure(
+            lambda: processor._extract_financial_metrics_from_excel(sheets), args.repeat),
+        # Retrieval plus token-budgeted prompt assembly, which replaced _create_financial_prompt
+        'prepare_prompt': measure(
+            lambda: engine._prepare_request("What was the net income trend?", text, context, retriever), args.repeat),
+    }
+
+
+def end_to_end(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    server = MockOllamaServer(first_token_delay=args.first_token, per_token_delay=args.per_token,
+                              max_concurrent=args.concurrency).start()
+    try:
+        text = make_document_text(args.pages)
+        retriever = BM25Retriever.from_document(text)
+        client = OllamaClient(server.url)
+        scheduler = LLMScheduler(max_concurrent=args.concurrency, max_waiting=args.questions)
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def ask(number: int):
+            engine = QAEngine(ollama_url=server.url, client=client, answer_cache=AnswerCache(),
+                              scheduler=scheduler)
+            started = time.perf_counter()
+            # Distinct questions so neither the answer cache nor coalescing hides the model
+            answer = engine.generate_response(f"What was the operating income in quarter {number}?",
+                                              text, retriever=retriever, document_id="bench")
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if answer.startswith("❌"):
+                    errors.append(answer)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            list(pool.map(ask, range(args.questions)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} end-to-end requests failed, first: {errors[0]}")
+    return {
+        'generate_response_latency': {
+            'median': statistics.median(latencies),
+            'p95': percentile(latencies, 0.95),
+            'min': min(latencies),
+        },
+        'generate_response_throughput': {'questions_per_second': args.questions / elapsed},
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            # Throughput should not drop, everything else is a duration
+            if metric.endswith('_per_second'):
+                change = reference / value - 1
+            else:
+                change = value / reference - 1
+            marker = "  REGRESSION" if change > tolerance else ""
+            print(f"  {name}.{metric}: {value:.4f} vs {reference:.4f} ({change:+.1%}){marker}")
+            if marker:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the Financial Q&A benchmarks")
+    parser.add_argument('--pages', type=int, default=60, help="Pages in the synthetic PDF")
+    parser.add_argument('--sheets', type=int, default=5, help="Sheets in the synthetic workbook")
+    parser.add_argument('--rows', type=int, default=2000, help="Rows per sheet")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per microbenchmark")
+    parser.add_argument('--questions', type=int, default=20, help="End-to-end questions")
+    parser.add_argument('--clients', type=int, default=4, help="Concurrent end-to-end askers")
+    parser.add_argument('--concurrency', type=int, default=1, help="Generations the mock serves at once")
+    parser.add_argument('--first-token', type=float, default=0.05, help="Mock prompt evaluation delay")
+    parser.add_argument('--per-token', type=float, default=0.002, help="Mock delay per generated token")
+    parser.add_argument('--skip-e2e', action='store_true', help="Only run the microbenchmarks")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before failing")
+    parser.add_argument('--json', help="Also write results to this file")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    results = micro_benchmarks(args)
+    if not args.skip_e2e:
+        results.update(end_to_end(args))
+
+    for name, metrics in results.items():
+        print(f"{name}: " + ", ".join(f"{metric}={value:.4f}" for metric, value in metrics.items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        try:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}, run with --save-baseline first", file=sys.stderr)
+            return 2
+        print("Compared with baseline:")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
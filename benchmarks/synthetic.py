@@ -0,0 +1,130 @@
+"""Synthetic financial documents for benchmarks: text PDFs and multi-sheet workbooks."""
+import random
+from io import BytesIO
+from typing import List
+
+import openpyxl
+
+LINE_ITEMS = [
+    'Revenue', 'Cost of revenue', 'Gross profit', 'Operating expenses', 'Operating income',
+    'Interest expense', 'Net income', 'Total assets', 'Total liabilities', 'Shareholders equity',
+    'Cash flow from operations', 'EBITDA', 'Earnings per share', 'Capital expenditure',
+]
+
+
+class SyntheticFile(BytesIO):
+    """In-memory document presented like Streamlit's UploadedFile"""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def _page_lines(page: int, rng: random.Random) -> List[str]:
+    year = 2019 + page % 6
+    lines = [f"Annual Report {year} - Page {page}", ""]
+    for item in rng.sample(LINE_ITEMS, 8):
+        lines.append(f"{item}: ${rng.randint(1, 999):,},{rng.randint(0, 999):03d}.{rng.randint(0, 99):02d}")
+    lines.append(f"Net revenue grew {rng.uniform(-10, 25):.1f}% compared with {year - 1}.")
+    lines.append("Management believes cash and operating cash flow are sufficient for the next twelve months.")
+    return lines
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+STATEMENT_ROWS = [
+    'Revenue', 'Cost of revenue', 'Gross profit', 'Operating expenses', 'Operating income',
+    'Interest expense', 'Income before taxes', 'Income tax expense', 'Net income',
+]
+
+
+def _statement_commands(page: int, rng: random.Random) -> List[str]:
+    """An income statement laid out in aligned columns, as annual reports print them"""
+    year = 2019 + page % 6
+    commands = [f"BT /F1 12 Tf 50 760 Td (Consolidated Statements of Operations - Page {page}) Tj ET"]
+    rows = [('(in thousands)', str(year), str(year - 1))]
+    for item in STATEMENT_ROWS:
+        current, previous = rng.randint(1000, 99999), rng.randint(1000, 99999)
+        cells = [f"{value:,}" if 'expense' not in item.lower() else f"({value:,})" for value in (current, previous)]
+        rows.append((item, *cells))
+    for index, row in enumerate(rows):
+        y = 720 - index * 18
+        for x, cell in zip((50, 350, 460), row):
+            commands.append(f"BT /F1 10 Tf {x} {y} Td ({_escape(cell)}) Tj ET")
+    return commands
+
+
+def make_pdf(pages: int, seed: int = 0, statement_every: int = 0) -> bytes:
+    """A text PDF with one short financial statement per page, written without a PDF library.
+
+    With ``statement_every`` set, every n-th page is a column-aligned income statement table instead.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(1, pages + 1):
+        if statement_every and page % statement_every == 0:
+            commands = _statement_commands(page, rng)
+        else:
+            commands = ["BT", "/F1 11 Tf", "14 TL", "50 780 Td"]
+            for line in _page_lines(page, rng):
+                commands.append(f"({_escape(line)}) Tj T*")
+            commands.append("ET")
+        stream = "\n".join(commands).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_workbook(sheets: int, rows: int, seed: int = 0) -> bytes:
+    """An .xlsx with a long-format ledger per sheet: period, segment and numeric metrics"""
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for index in range(sheets):
+        sheet = workbook.create_sheet(f"Segment {index + 1}")
+        sheet.append(['Year', 'Quarter', 'Region', 'Revenue', 'Operating Expenses', 'Net Income', 'Cash'])
+        for row in range(rows):
+            revenue = rng.uniform(1e5, 5e6)
+            expenses = revenue * rng.uniform(0.5, 0.95)
+            sheet.append([
+                2015 + row % 10, f"Q{row % 4 + 1}", rng.choice(['EMEA', 'APAC', 'AMER']),
+                round(revenue, 2), round(expenses, 2), round(revenue - expenses, 2), round(rng.uniform(0, 1e6), 2),
+            ])
+    out = BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def make_document_text(pages: int, seed: int = 0) -> str:
+    """Processed-document text in DocumentProcessor's page-marker format"""
+    rng = random.Random(seed)
+    return "".join(
+        f"\n--- Page {page} ---\n" + "\n".join(_page_lines(page, rng))
+        for page in range(1, pages + 1)
+    )
@@ -0,0 +1,27 @@
+import os
+import time
+
+from utils.corpus import new_corpus_id, prune_corpora
+
+
+def _make_corpus(root, size: int, age_days: float) -> str:
+    corpus_id = new_corpus_id()
+    shard_dir = os.path.join(str(root), corpus_id, 'shards')
+    os.makedirs(shard_dir)
+    with open(os.path.join(shard_dir, 'shard.pkl'), 'wb') as f:
+        f.write(b'x' * size)
+    used_at = time.time() - age_days * 24 * 3600
+    os.utime(os.path.join(str(root), corpus_id), (used_at, used_at))
+    return corpus_id
+
+
+def test_prune_drops_stale_corpora_then_least_recently_used(tmp_path):
+    stale = _make_corpus(tmp_path, 10, age_days=40)
+    older = _make_corpus(tmp_path, 600, age_days=2)
+    recent = _make_corpus(tmp_path, 600, age_days=1)
+    os.makedirs(tmp_path / 'default')
+
+    removed = prune_corpora(str(tmp_path), max_bytes=1000)
+
+    assert removed == [stale, older]
+    assert sorted(os.listdir(tmp_path)) == sorted([recent, 'default'])
@@ -0,0 +1,21 @@
+import os
+import pickle
+
+from benchmarks.synthetic import SyntheticFile, make_workbook
+from utils.document_cache import DocumentCache
+from utils.document_processor import DocumentProcessor
+
+
+def test_cached_workbook_pickles_its_path_not_its_bytes(tmp_path):
+    data = make_workbook(2, 2000)
+    processor = DocumentProcessor(cache=DocumentCache(str(tmp_path)))
+    _, metadata = processor.parse_document(SyntheticFile('ledger.xlsx', data))
+
+    workbook = metadata['tables'].tables
+    assert workbook.source == os.path.join(str(tmp_path), metadata['content_hash'], 'workbook.xlsx')
+    assert len(pickle.dumps(metadata)) < len(data) // 10
+
+    _, cached = DocumentProcessor(cache=DocumentCache(str(tmp_path))).parse_document(
+        SyntheticFile('ledger.xlsx', data))
+    assert cached['tables'].tables.source == workbook.source
+    assert list(cached['tables'].tables['Segment 1'].columns)[0] == 'Year'
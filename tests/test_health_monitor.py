@@ -0,0 +1,47 @@
+import socket
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import ProtocolError
+
+from benchmarks.mock_ollama import MockOllamaServer
+from utils.health_monitor import OllamaHealthMonitor
+from utils.ollama_client import OllamaClient
+
+
+def _closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_refused_connection_marks_the_server_down():
+    url = _closed_port_url()
+    monitor = OllamaHealthMonitor(url, client=OllamaClient(url, retries=0))
+    monitor.record_success('gemma:2b')
+
+    with pytest.raises(requests.exceptions.ConnectionError) as refused:
+        monitor.client.post("/api/generate", {})
+    monitor.record_failure(refused.value)
+
+    assert not monitor.status(block=False)['connected']
+
+
+def test_dropped_response_only_reprobes():
+    server = MockOllamaServer().start()
+    try:
+        monitor = OllamaHealthMonitor(server.url)
+        checked_at = monitor.refresh()['checked_at']
+
+        reset = requests.exceptions.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError()))
+        monitor.record_failure(reset)
+
+        assert monitor.status(block=False)['connected']
+        deadline = time.monotonic() + 5
+        while monitor.status(block=False)['checked_at'] == checked_at and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert monitor.status(block=False)['checked_at'] > checked_at
+        assert monitor.status(block=False)['connected']
+    finally:
+        server.stop()
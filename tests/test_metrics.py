@@ -0,0 +1,30 @@
+import time
+
+from benchmarks.mock_ollama import MockOllamaServer
+from utils.answer_cache import AnswerCache
+from utils.metrics import get_metrics
+from utils.ollama_router import OllamaRouter
+from utils.qa_engine import QAEngine
+
+
+def _http_seconds() -> float:
+    for histogram in get_metrics().snapshot()['histograms']:
+        if histogram['labels'] == {'stage': 'http'}:
+            return histogram['sum']
+    return 0.0
+
+
+def test_http_stage_leaves_out_a_slow_reader():
+    server = MockOllamaServer(first_token_delay=0.1, per_token_delay=0.001).start()
+    try:
+        engine = QAEngine(router=OllamaRouter.from_urls([server.url]), answer_cache=AnswerCache())
+        before = _http_seconds()
+        deltas = 0
+        for _ in engine.stream_response("What was revenue?", "Revenue was $5."):
+            deltas += 1
+            time.sleep(0.02)
+
+        assert deltas > 10
+        assert _http_seconds() - before < 0.1 + deltas * 0.01
+    finally:
+        server.stop()
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from utils.pdf_tables import dedupe_tables, table_frame
+
+
+def test_table_frame_uses_year_row_as_header_and_reads_negatives():
+    frame = table_frame([
+        ["Consolidated Statements of Operations", None, None],
+        ["(in thousands)", "2023", "2022"],
+        ["Revenue", "$1,200", "1,100"],
+        ["Interest expense", "(300)", "—"],
+    ])
+
+    assert list(frame.columns) == ["(in thousands)", "2023", "2022"]
+    assert frame["2023"].tolist() == [1200.0, -300.0]
+    assert pd.isna(frame["2022"].iloc[1])
+
+
+def test_reprinted_statement_is_kept_once():
+    def table(page, title, revenue):
+        frame = pd.DataFrame({'Line item': ['Revenue'], '2023': [revenue], '2022': [90.0]})
+        return {'statement': 'Income statement', 'page': page, 'title': title, 'frame': frame}
+
+    tables = dedupe_tables([
+        table(10, 'consolidated statements of operations', 100.0),
+        table(4, 'consolidated statements of operations', 100.0),
+        table(12, 'segment results', 40.0),
+    ])
+
+    assert [table['page'] for table in tables] == [4, 12]
@@ -0,0 +1,18 @@
+import os
+import time
+
+from utils.spool import prune_spools
+
+
+def test_prune_removes_only_old_spool_files(tmp_path):
+    old = tmp_path / 'upload-old.pdf'
+    fresh = tmp_path / 'upload-fresh.pdf'
+    other = tmp_path / 'notes.txt'
+    for path in (old, fresh, other):
+        path.write_bytes(b'%PDF')
+    stale = time.time() - 2 * 24 * 3600
+    os.utime(old, (stale, stale))
+    os.utime(other, (stale, stale))
+
+    assert prune_spools(str(tmp_path)) == [str(old)]
+    assert sorted(os.listdir(tmp_path)) == ['notes.txt', 'upload-fresh.pdf']
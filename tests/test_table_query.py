@@ -0,0 +1,49 @@
+import pandas as pd
+
+from utils.table_query import TableStore
+
+
+def statement(columns, revenue, net_income):
+    frame = {'Line item': pd.Series(['Revenue', 'Net income'], dtype='string')}
+    for column, values in zip(columns, zip(revenue, net_income)):
+        frame[column] = list(values)
+    return pd.DataFrame(frame)
+
+
+def test_total_of_statement_row_is_latest_period_not_sum():
+    store = TableStore({'Income': statement(['2023', '2022'], [100.0, 90.0], [10.0, 8.0])})
+
+    answer = store.answer("What is the total revenue?")
+
+    assert answer == "**Revenue** (2023, sheet *Income*): 100"
+    assert "190" not in answer
+
+
+def test_statement_aggregates_across_periods_only_when_asked():
+    store = TableStore({'Income': statement(['2023', '2022'], [100.0, 90.0], [10.0, 8.0])})
+
+    assert store.answer("What was the highest revenue?") is None
+    assert store.answer("What was the average revenue over the years?") == "**Average Revenue** (sheet *Income*): 95"
+
+
+def test_repeated_statements_answer_once_from_the_newest():
+    current = statement(['2023', '2022'], [100.0, 90.0], [10.0, 8.0])
+    prior = statement(['2022', '2021'], [90.0, 80.0], [8.0, 7.0])
+    store = TableStore({
+        'Income statement (page 10)': current,
+        'Income statement (page 30)': prior,
+        'Income statement (page 31)': prior.copy(),
+    }, source_label='table')
+
+    assert store.answer("What is the total revenue?") == "**Revenue** (2023, table *Income statement (page 10)*): 100"
+    assert store.answer("What was net income in 2022?") == "**Net income** (2022, table *Income statement (page 10)*): 8"
+    assert store.answer("What was net income in 2021?") == "**Net income** (2021, table *Income statement (page 30)*): 7"
+
+
+def test_wide_sheet_year_must_match_a_column():
+    wide = pd.DataFrame({'Segment': ['North', 'South'], 'Revenue 2022': [100.0, 200.0], 'Revenue 2023': [150.0, 150.0]})
+    store = TableStore({'Wide': wide})
+
+    assert store.answer("What was revenue in 2023?") == "**Total Revenue 2023** (sheet *Wide*): 300"
+    assert store.answer("What was revenue in 2019?") is None
+    assert store.answer("Total revenue for the latest period?") is None
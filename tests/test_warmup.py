@@ -0,0 +1,33 @@
+import time
+
+from benchmarks.mock_ollama import MockOllamaServer
+from utils.answer_cache import AnswerCache
+from utils.ollama_router import OllamaRouter
+from utils.qa_engine import QAEngine
+from utils.scheduler import LLMScheduler
+from utils.warmup import WarmupJob
+
+DOCUMENT = "Revenue for 2023 was $1,200 and operating expenses were $800."
+
+
+def test_question_cuts_off_warmup_in_prompt_evaluation():
+    server = MockOllamaServer(first_token_delay=1.0, per_token_delay=0.001).start()
+    try:
+        engine = QAEngine(router=OllamaRouter.from_urls([server.url]), answer_cache=AnswerCache(),
+                          scheduler=LLMScheduler())
+        job = WarmupJob(engine, ["What was the operating margin?"], DOCUMENT).start()
+        deadline = time.monotonic() + 5
+        while server.requests == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+
+        started = time.perf_counter()
+        answer = engine.generate_response("What was revenue in 2023?", DOCUMENT)
+        elapsed = time.perf_counter() - started
+
+        assert not answer.startswith("❌"), answer
+        # One prompt evaluation, not the rest of the warm-up's followed by our own
+        assert elapsed < 1.6, elapsed
+        job.cancel()
+    finally:
+        server.stop()
@@ -0,0 +1,129 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.storage import content_hash, get_cache_dir
+
+FILLER_PATTERN = re.compile(r'\b(?:please|kindly|can you|could you|tell me|show me|i want to know)\b')
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9.%$€£¥]+')
+
+
+def normalize_question(question: str) -> str:
+    """Canonical form so trivial rephrasings share a cache entry"""
+    text = question.lower()
+    text = FILLER_PATTERN.sub(' ', text)
+    text = NON_WORD_PATTERN.sub(' ', text)
+    return ' '.join(text.split()).strip('. ')
+
+
+class AnswerCache:
+    """LRU cache of generated answers with an optional SQLite tier that survives restarts"""
+
+    def __init__(self, max_entries: int = 512, disk_path: Optional[str] = None,
+                 max_disk_entries: int = 20000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, used REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(document_id: str, model_name: str, question: str, context: str) -> str:
+        return content_hash(document_id or '', model_name, normalize_question(question), context)
+
+    @staticmethod
+    def sample_key(document_id: str, model_name: str, question: str) -> str:
+        """Key of a pre-generated sample answer, which does not depend on the conversation so far"""
+        return content_hash(document_id or '', model_name, normalize_question(question), '\x00sample')
+
+    def get(self, *keys: str) -> Optional[str]:
+        """The answer under the first key that has one, counted as a single hit or miss"""
+        with self._lock:
+            for key in keys:
+                answer = self._lookup(key)
+                if answer is not None:
+                    self.hits += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def _lookup(self, key: str) -> Optional[str]:
+        answer = self._entries.get(key)
+        if answer is not None:
+            self._entries.move_to_end(key)
+            return answer
+
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE answers SET used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+            except sqlite3.Error:
+                # A locked or damaged disk tier only costs a regeneration
+                row = None
+            if row is not None:
+                self._remember(key, row[0])
+                return row[0]
+        return None
+
+    def put(self, key: str, answer: str):
+        with self._lock:
+            self._remember(key, answer)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO answers (key, answer, used) VALUES (?, ?, ?)",
+                        (key, answer, time.time())
+                    )
+                    # Trim the least recently used rows once the table outgrows its limit
+                    self._db.execute(
+                        "DELETE FROM answers WHERE key IN "
+                        "(SELECT key FROM answers ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def _remember(self, key: str, answer: str):
+        self._entries[key] = answer
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache shared by every session, persisted under the cache root"""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache(disk_path=os.path.join(get_cache_dir('answers'), 'answers.sqlite3'))
+        return _answer_cache
@@ -0,0 +1,161 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from utils.prompt_builder import estimate_tokens, fit_tokens
+
+FACT_KEYWORDS = [
+    'revenue', 'income', 'profit', 'loss', 'expenses', 'expense', 'cost', 'margin',
+    'assets', 'liabilities', 'equity', 'cash', 'debt', 'ebitda', 'earnings', 'eps', 'dividend',
+]
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+|\n+')
+YEAR_PATTERN = re.compile(r'\b(?:19|20)\d{2}\b')
+# Amounts worth remembering: currency, thousands separators, decimals, scale words or percentages
+AMOUNT_PATTERN = re.compile(
+    r'[\$€£¥]\s?\d[\d,]*(?:\.\d+)?|\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+\.\d+|\d+(?:\.\d+)?\s?(?:%|percent\b)'
+    r'|\d+(?:\.\d+)?\s?(?:million|billion|thousand|[MBK])\b'
+)
+
+# One worker for every session keeps each memory's updates in order and off the request path
+_updater = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation-memory')
+
+
+class ConversationMemory:
+    """Fixed-size memory of a chat for the prompt's conversation context.
+
+    After each answer, off the request thread, the exchange is folded into
+    three parts:
+    - the latest exchange, kept nearly verbatim;
+    - a rolling extractive summary, one line per earlier question with the
+      answer's lead sentence;
+    - the numeric facts established so far, one per financial keyword and
+      period with the latest value winning.
+    ``context()`` renders them into a block of at most ``max_tokens``
+    estimated tokens, dropping the oldest summary lines and facts first, so
+    the prompt stays the same size however long the conversation gets.
+    """
+
+    def __init__(self, max_tokens: int = 240, max_summary_lines: int = 12, max_facts: int = 12,
+                 keywords: Sequence[str] = FACT_KEYWORDS, asynchronous: bool = True):
+        self.max_tokens = max_tokens
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self.asynchronous = asynchronous
+        self._last = None
+        self._summary = deque(maxlen=max_summary_lines)
+        self._facts = OrderedDict()
+        self._max_facts = max_facts
+        self._generation = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def add_exchange(self, question: str, answer: str):
+        """Fold a question and its answer into the memory, in the background by default"""
+        with self._lock:
+            generation = self._generation
+        if not self.asynchronous:
+            self._absorb(question, answer, generation)
+            return
+        future = _updater.submit(self._absorb, question, answer, generation)
+        with self._lock:
+            self._pending = future
+
+    def wait(self, timeout: Optional[float] = 1.0):
+        """Let an in-flight update land; it only runs a few regexes over one answer"""
+        with self._lock:
+            pending = self._pending
+        if pending is not None:
+            try:
+                pending.result(timeout)
+            except Exception:
+                # A failed or slow update leaves the previous memory in place
+                pass
+
+    def clear(self):
+        with self._lock:
+            # Updates queued before the clear are discarded when they run
+            self._generation += 1
+            self._last = None
+            self._summary.clear()
+            self._facts.clear()
+            self._pending = None
+
+    def _absorb(self, question: str, answer: str, generation: int):
+        sentences = [sentence.strip() for sentence in SENTENCE_PATTERN.split(answer) if sentence.strip()]
+        facts = self._extract_facts(sentences)
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._last is not None:
+                # The previous exchange drops from verbatim to a one-line summary
+                self._summary.append(self._summary_line(*self._last))
+            self._last = (question, answer, sentences)
+            for key, fact in facts:
+                self._facts.pop(key, None)
+                self._facts[key] = fact
+            while len(self._facts) > self._max_facts:
+                self._facts.popitem(last=False)
+
+    def _extract_facts(self, sentences: List[str]) -> List[tuple]:
+        facts = []
+        for sentence in sentences:
+            if not AMOUNT_PATTERN.search(sentence):
+                continue
+            lowered = sentence.lower()
+            for keyword in self.keywords:
+                if keyword in lowered:
+                    # Figures for different years are separate facts, a restatement replaces its own
+                    key = (keyword, tuple(sorted(set(YEAR_PATTERN.findall(sentence)))))
+                    facts.append((key, fit_tokens(sentence, 48, "...")))
+                    break
+        return facts
+
+    def _summary_line(self, question: str, answer: str, sentences: List[str]) -> str:
+        lead = sentences[0] if sentences else answer
+        return f"- {fit_tokens(question, 24, '...')} -> {fit_tokens(lead, 40, '...')}"
+
+    def context(self) -> str:
+        """The conversation block for the next prompt, never over ``max_tokens``"""
+        self.wait()
+        with self._lock:
+            last = self._last
+            summary = list(self._summary)
+            facts = list(self._facts.values())
+        if last is None:
+            return ""
+
+        question, answer, _ = last
+        recent = f"Last question: {question}\nLast answer: {answer}"
+        header = "Previous conversation:\n"
+        budget = self.max_tokens - estimate_tokens(header)
+        # The latest exchange gets up to half the block; facts and summary share the rest
+        recent = fit_tokens(recent, budget // 2, "...")
+        budget -= estimate_tokens(recent)
+
+        sections = []
+        figures = self._newest_within("Established figures:", [f"- {fact}" for fact in facts], budget // 2)
+        if figures:
+            sections.append(figures)
+            budget -= estimate_tokens(figures)
+        earlier = self._newest_within("Earlier questions:", summary, budget)
+        if earlier:
+            sections.append(earlier)
+        sections.append(recent)
+        return header + "\n".join(sections) + "\n"
+
+    @staticmethod
+    def _newest_within(heading: str, lines: List[str], budget: int) -> str:
+        """A titled section of the newest lines that fit the budget, in chronological order"""
+        used = estimate_tokens(heading) + 1
+        kept = []
+        for line in reversed(lines):
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        if not kept:
+            return ""
+        return "\n".join([heading] + kept[::-1])
@@ -0,0 +1,307 @@
+import heapq
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Dict, List, Optional
+
+from utils.retriever import BM25Retriever, Retriever, bm25_idf, tokenize
+from utils.spool import spool_upload
+from utils.storage import content_hash, get_cache_dir
+
+# Version 2 ids documents by their bytes alone, version 1 ids included the processor version
+MANIFEST_VERSION = 2
+
+CORPUS_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# Corpora unused this long are deleted, then the least recently used until the rest fit
+CORPUS_MAX_AGE_SECONDS = 30 * 24 * 3600
+CORPUS_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class CorpusError(Exception):
+    pass
+
+
+class DocumentCorpus(Retriever):
+    """A persistent set of documents searched as one, with one BM25 shard per document.
+
+    Each shard is pickled under ``shards/`` and listed in ``manifest.json``.
+    Adding a document parses and indexes only that document, and a document
+    already in the corpus (same bytes) is not added twice. Searches score
+    every shard with corpus-wide term statistics, so scores can be compared
+    across documents, and merge the shard results into one top-k list.
+    """
+
+    def __init__(self, corpus_dir: Optional[str] = None):
+        self.corpus_dir = corpus_dir or get_cache_dir(os.path.join('corpus', 'default'))
+        self.shard_dir = os.path.join(self.corpus_dir, 'shards')
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.corpus_dir, 'manifest.json')
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._norms = {}
+        self._documents = self._read_manifest()
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            # An unreadable manifest loses the listing, the shards are rebuilt on re-upload
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            # Shards of an older layout are keyed differently and would never be found again
+            for name in os.listdir(self.shard_dir):
+                try:
+                    os.remove(os.path.join(self.shard_dir, name))
+                except OSError:
+                    pass
+            return {}
+        return manifest.get('documents', {})
+
+    def _write_manifest(self):
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'documents': self._documents}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _shard_path(self, document_id: str) -> str:
+        return os.path.join(self.shard_dir, f"{document_id}.pkl")
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Manifest entries in the order the documents were added"""
+        with self._lock:
+            return sorted(
+                (dict(entry, document_id=document_id) for document_id, entry in self._documents.items()),
+                key=lambda entry: entry['added_at']
+            )
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._documents
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def fingerprint(self) -> str:
+        """Identifies the current set of documents, for answer caching"""
+        return content_hash('corpus', *sorted(self._documents))
+
+    def add_document(self, document_processor, uploaded_file) -> str:
+        """Parse and index one document into its own shard; returns its document id"""
+        # Spool once for both the id hash and the parse
+        upload = spool_upload(uploaded_file)
+        try:
+            # Keyed by the bytes alone, so a processor version bump does not index a filing twice
+            document_id = content_hash(upload.view)
+            if document_id in self._documents:
+                return document_id
+            content, metadata = document_processor.process_document(upload)
+        finally:
+            if upload is not uploaded_file:
+                upload.close()
+        if not content:
+            raise CorpusError(f"Failed to extract content from {uploaded_file.name}")
+
+        shard = BM25Retriever.from_document(content)
+        for chunk in shard.chunks:
+            # Keep the file name in the section header so answers can cite it
+            chunk['document'] = uploaded_file.name
+            chunk['source'] = f"{uploaded_file.name} · {chunk['source']}"
+        self.add_shard(document_id, shard, {
+            'filename': uploaded_file.name,
+            'file_type': metadata.get('file_type', 'Unknown'),
+            'file_size': metadata.get('file_size', 0),
+            'chunks': len(shard.chunks),
+            'content_chars': len(content),
+        })
+        return document_id
+
+    def add_shard(self, document_id: str, shard: BM25Retriever, entry: Dict[str, Any]):
+        path = self._shard_path(document_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(shard, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._documents[document_id] = dict(
+                entry,
+                length=shard.total_length,
+                added_at=time.time()
+            )
+            self._shards[document_id] = shard
+            # Corpus-wide averages changed, cached normalisations are stale
+            self._norms.clear()
+            self._write_manifest()
+
+    def remove_document(self, document_id: str):
+        with self._lock:
+            if self._documents.pop(document_id, None) is None:
+                return
+            self._shards.pop(document_id, None)
+            self._norms.clear()
+            self._write_manifest()
+        try:
+            os.remove(self._shard_path(document_id))
+        except OSError:
+            pass
+
+    def clear(self):
+        for document_id in list(self._documents):
+            self.remove_document(document_id)
+
+    def _shard(self, document_id: str) -> Optional[BM25Retriever]:
+        shard = self._shards.get(document_id)
+        if shard is not None:
+            return shard
+        try:
+            with open(self._shard_path(document_id), 'rb') as f:
+                shard = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Missing or unreadable shard, drop it from the listing
+            self.remove_document(document_id)
+            return None
+        self._shards[document_id] = shard
+        return shard
+
+    def _loaded_shards(self) -> List[tuple]:
+        shards = []
+        for position, entry in enumerate(self.documents()):
+            shard = self._shard(entry['document_id'])
+            if shard is not None and shard.chunks:
+                shards.append((position, entry['document_id'], shard))
+        return shards
+
+    @property
+    def chunks(self) -> List[Dict[str, Any]]:
+        # Ids become (document position, chunk id) so build_context keeps corpus order
+        with self._lock:
+            return [
+                dict(chunk, id=(position, chunk['id']))
+                for position, _, shard in self._loaded_shards()
+                for chunk in shard.chunks
+            ]
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        with self._lock:
+            shards = self._loaded_shards()
+            if not shards:
+                return []
+
+            # Corpus-wide statistics so a term rare in the corpus scores the same in every shard
+            chunk_count = sum(len(shard.chunks) for _, _, shard in shards)
+            total_length = sum(shard.total_length for _, _, shard in shards)
+            avg_length = total_length / chunk_count or 1.0
+            idfs = {}
+            for term in set(tokenize(query)):
+                df = sum(shard.document_frequency(term) for _, _, shard in shards)
+                if df:
+                    idfs[term] = bm25_idf(chunk_count, df)
+            if not idfs:
+                return []
+
+            candidates = []
+            for position, document_id, shard in shards:
+                norms = self._norms.get(document_id)
+                if norms is None:
+                    norms = self._norms[document_id] = shard.length_norms(avg_length)
+                scores = shard.score(idfs, norms)
+                # Each shard contributes at most top_k, the merge keeps the overall best
+                for chunk_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+                    candidates.append((score, position, document_id, chunk_id))
+
+            best = heapq.nlargest(top_k, candidates, key=lambda item: item[0])
+            return [
+                dict(self._shards[document_id].chunks[chunk_id], id=(position, chunk_id), score=score)
+                for score, position, document_id, chunk_id in best
+            ]
+
+    def overview(self) -> str:
+        """Short description of the corpus, used where a single document's text would be"""
+        lines = ["Document corpus:"]
+        for entry in self.documents():
+            lines.append(f"- {entry['filename']} ({entry['file_type']}, {entry['chunks']} sections)")
+        return '\n'.join(lines)
+
+
+# Open corpora by id, held only while a session references them
+_corpora = weakref.WeakValueDictionary()
+_corpus_lock = threading.Lock()
+_pruned = False
+
+
+def new_corpus_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_corpus(corpus_id: str) -> DocumentCorpus:
+    """The corpus with this id, persisted under the cache root; sessions sharing an id share one instance"""
+    if not CORPUS_ID_PATTERN.fullmatch(corpus_id or ''):
+        raise CorpusError(f"Invalid corpus id: {corpus_id!r}")
+    global _pruned
+    with _corpus_lock:
+        if not _pruned:
+            # Once per process, before any corpus is open
+            _pruned = True
+            prune_corpora()
+        corpus = _corpora.get(corpus_id)
+        if corpus is None:
+            corpus = DocumentCorpus(get_cache_dir(os.path.join('corpus', corpus_id)))
+            _corpora[corpus_id] = corpus
+        # Directory mtime records last use for pruning
+        try:
+            os.utime(corpus.corpus_dir)
+        except OSError:
+            pass
+        return corpus
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def prune_corpora(root: Optional[str] = None, max_age: float = CORPUS_MAX_AGE_SECONDS,
+                  max_bytes: int = CORPUS_MAX_BYTES) -> List[str]:
+    """Delete corpora unused for ``max_age`` seconds, then the least recently used beyond ``max_bytes``.
+
+    Corpora open in this process are kept and not counted. Returns the ids removed.
+    """
+    root = root or get_cache_dir('corpus')
+    entries = []
+    total = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not CORPUS_ID_PATTERN.fullmatch(name) or name in _corpora:
+            continue
+        try:
+            used_at = os.path.getmtime(path)
+        except OSError:
+            continue
+        size = _directory_size(path)
+        entries.append((used_at, size, name))
+        total += size
+
+    removed = []
+    now = time.time()
+    for used_at, size, name in sorted(entries):
+        if now - used_at <= max_age and total <= max_bytes:
+            break
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed.append(name)
+        total -= size
+    return removed
@@ -0,0 +1,94 @@
+import os
+import pickle
+import shutil
+import threading
+import uuid
+from typing import Any, Optional
+
+from utils.storage import get_cache_dir
+
+
+class DocumentCache:
+    """Content-addressed disk cache for parsed documents and their derived artifacts.
+
+    Each entry is a directory named after the document key holding one pickle
+    per artifact (``parsed``, ``bm25`` ...). Entries are evicted least recently
+    used first once the cache grows beyond ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir or get_cache_dir('documents')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str, artifact: str) -> Optional[Any]:
+        path = os.path.join(self._entry_dir(key), f"{artifact}.pkl")
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Corrupt or written by an incompatible version, treat as a miss
+            self.invalidate(key)
+            return None
+
+        # Directory mtime records last use for LRU eviction
+        try:
+            os.utime(self._entry_dir(key))
+        except OSError:
+            pass
+        return value
+
+    def store(self, key: str, artifact: str, value: Any):
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        path = os.path.join(entry_dir, f"{artifact}.pkl")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        os.utime(entry_dir)
+        self._evict()
+
+    def store_file(self, key: str, name: str, source_path: str) -> str:
+        """Place a file in the entry for artifacts that refer to it by path; returns its path"""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        path = os.path.join(entry_dir, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            # Spools live under the same cache root, so a hard link usually avoids the copy
+            os.link(source_path, tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def invalidate(self, key: str):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                entry_dir = self._entry_dir(name)
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry_dir, filename))
+                        for filename in os.listdir(entry_dir)
+                    )
+                    entries.append((os.path.getmtime(entry_dir), size, name))
+                except OSError:
+                    continue
+                total += size
+
+            entries.sort()
+            while total > self.max_bytes and len(entries) > 1:
+                _, size, name = entries.pop(0)
+                self.invalidate(name)
+                total -= size
@@ -1,143 +1,452 @@
 import pandas as pd
 import PyPDF2
 import streamlit as st
-from io import BytesIO
-import re
-from typing import Dict, List, Tuple, Any
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from utils.document_cache import DocumentCache
+from utils.excel_loader import LazyWorkbook, sheet_statistics
+from utils.metric_extractor import FinancialMetricExtractor
+from utils.metrics import get_metrics
+from utils.pdf_tables import dedupe_tables, extract_tables, name_tables, statement_pages
+from utils.spool import SpooledUpload, spool_upload
+from utils.storage import content_hash
+from utils.table_query import TableStore
+
+# Bump whenever extraction output changes so stale cache entries are ignored
+PROCESSOR_VERSION = "5"
+
+# Pages per worker task when streaming, small enough that the first pages arrive early
+PROGRESS_BATCH_PAGES = 10
+
+_pdf_pool = None
+_pdf_pool_workers = 0
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by all uploads, recreated only if the worker count changes"""
+    global _pdf_pool, _pdf_pool_workers
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_workers != workers:
+            if _pdf_pool is not None:
+                _pdf_pool.shutdown(wait=False)
+            # Forking Streamlit's multi-threaded server can copy locks held by other threads
+            # into the child, so workers start from a fresh interpreter instead
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pdf_pool_workers = workers
+        return _pdf_pool
+
+
+def _reset_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False)
+        _pdf_pool = None
+
+
+def _extract_pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process, each worker opens the spooled file and parses its own reader
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() for i in range(start, stop)]
+
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, cache: Optional[DocumentCache] = None, use_cache: bool = True,
+                 pdf_workers: Optional[int] = None, parallel_page_threshold: int = 40,
+                 lazy_excel: bool = True, excel_memory_limit: int = 256 * 1024 * 1024,
+                 pdf_tables: bool = True, parallel_table_threshold: int = 4):
+        self.cache = (cache or DocumentCache()) if use_cache else None
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.parallel_page_threshold = parallel_page_threshold
+        # Statement tables are pulled out of PDFs with pdfplumber, which is slow per page,
+        # so it only scans statement pages and goes parallel sooner than text extraction
+        self.pdf_tables = pdf_tables
+        self.parallel_table_threshold = parallel_table_threshold
+        self.lazy_excel = lazy_excel
+        self.excel_memory_limit = excel_memory_limit
         self.supported_formats = ['.pdf', '.xlsx', '.xls']
         self.financial_keywords = [
             'revenue', 'income', 'profit', 'loss', 'expenses', 'cost',
             'assets', 'liabilities', 'equity', 'cash', 'flow', 'balance',
             'statement', 'earnings', 'ebitda', 'gross', 'net', 'operating', 'total'
         ]
+        self.metric_extractor = FinancialMetricExtractor(self.financial_keywords)
+        self.metrics = get_metrics()
 
     def process_document(self, uploaded_file) -> Tuple[str, Dict[str, Any]]:
+        with self.metrics.span('process_document'):
+            try:
+                return self.parse_document(uploaded_file)
+            except Exception as e:
+                st.error(f"Error processing document: {str(e)}")
+                return "", {}
+
+    def parse_document(self, uploaded_file) -> Tuple[str, Dict[str, Any]]:
+        """Parse a document through the cache without any Streamlit calls; errors propagate"""
+        upload = None
         try:
             file_extension = uploaded_file.name.lower().split('.')[-1]
+            if file_extension not in ['pdf', 'xlsx', 'xls']:
+                raise ValueError(f"Unsupported file format: {file_extension}")
+
+            upload = spool_upload(uploaded_file)
+            key = self.document_key(upload)
+            if self.cache is not None:
+                cached = self.cache.load(key, 'parsed')
+                if cached is not None:
+                    self.metrics.increment('document_cache_total', result='hit')
+                    content, metadata = cached
+                    return content, dict(metadata, filename=uploaded_file.name)
+                self.metrics.increment('document_cache_total', result='miss')
+
             if file_extension == 'pdf':
-                return self._process_pdf(uploaded_file)
-            elif file_extension in ['xlsx', 'xls']:
-                return self._process_excel(uploaded_file)
+                content, metadata = self._process_pdf(upload)
             else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-        except Exception as e:
-            st.error(f"Error processing document: {str(e)}")
-            return "", {}
+                content, metadata = self._process_excel(upload)
 
-    def _process_pdf(self, uploaded_file) -> Tuple[str, Dict[str, Any]]:
+            metadata['content_hash'] = key
+            self._cache_parsed(key, content, metadata)
+            return content, metadata
+        finally:
+            self._release_spool(upload, uploaded_file)
+
+    def iter_document(self, uploaded_file) -> Iterator[Dict[str, Any]]:
+        """Yield document sections as they are extracted so callers can index them early.
+
+        Each item carries 'text', 'completed' and 'total'. The final item has
+        empty text and carries the document 'metadata'. Errors propagate.
+        The 'process_document' stage records the time spent parsing, not the
+        time the caller spends between sections.
+        """
+        file_extension = uploaded_file.name.lower().split('.')[-1]
+        if file_extension not in ['pdf', 'xlsx', 'xls']:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+
+        resumed = time.perf_counter()
+        upload = spool_upload(uploaded_file)
         try:
-            pdf_reader = PyPDF2.PdfReader(BytesIO(uploaded_file.getvalue()))
-            text_content = ""
-            
-            for page_num, page in enumerate(pdf_reader.pages):
-                text_content += f"\n--- Page {page_num + 1} ---\n"
-                text_content += page.extract_text()
+            key = self.document_key(upload)
+            if self.cache is not None:
+                cached = self.cache.load(key, 'parsed')
+                self.metrics.increment('document_cache_total', result='hit' if cached is not None else 'miss')
+                if cached is not None:
+                    self.metrics.observe_stage('process_document', time.perf_counter() - resumed)
+                    content, metadata = cached
+                    yield {'text': content, 'completed': 1, 'total': 1}
+                    yield {'text': '', 'completed': 1, 'total': 1,
+                           'metadata': dict(metadata, filename=uploaded_file.name)}
+                    return
+
+            parts = []
+            busy = 0.0
+            sections = self._iter_pdf(upload) if file_extension == 'pdf' else self._iter_excel(upload)
+            while True:
+                try:
+                    section = next(sections)
+                except StopIteration as stop:
+                    # The section generators return the metadata once exhausted
+                    metadata = stop.value
+                    break
+                parts.append(section['text'])
+                busy += time.perf_counter() - resumed
+                yield section
+                resumed = time.perf_counter()
+        finally:
+            self._release_spool(upload, uploaded_file)
+
+        metadata['content_hash'] = key
+        content = ''.join(parts)
+        self._cache_parsed(key, content, metadata)
+        self.metrics.observe_stage('process_document', busy + time.perf_counter() - resumed)
+        total = section['total'] if parts else 0
+        yield {'text': '', 'completed': total, 'total': total, 'metadata': metadata}
+
+    def _iter_pdf(self, upload: SpooledUpload):
+        with upload.open() as stream:
+            pdf_reader = PyPDF2.PdfReader(stream)
+            page_count = len(pdf_reader.pages)
+            parts = []
+            page_texts = []
+            batches = self._pdf_page_batches(upload.path, pdf_reader, page_count, PROGRESS_BATCH_PAGES)
+            for batch in batches:
+                for text in batch:
+                    page_texts.append(text)
+                    page_text = f"\n--- Page {len(page_texts)} ---\n" + text
+                    parts.append(page_text)
+                    yield {'text': page_text, 'completed': len(page_texts), 'total': page_count}
+        metadata = self._pdf_metadata(upload, upload.size, page_count, ''.join(parts))
+        self._add_pdf_tables(metadata, upload.path, page_texts)
+        return metadata
+
+    def _iter_excel(self, uploaded_file):
+        excel_data = self._open_workbook(uploaded_file)
+        sheet_metrics = {}
+        metric_seconds = 0.0
+        for i, sheet_name in enumerate(excel_data):
+            # Only one sheet needs to be resident at a time in lazy mode
+            df = excel_data[sheet_name]
+            started = time.perf_counter()
+            stats = self._sheet_statistics(excel_data, sheet_name, df)
+            sheet_metrics[sheet_name] = self._sheet_metrics(df, stats)
+            metric_seconds += time.perf_counter() - started
+            truncated = getattr(excel_data, 'truncated_sheets', {}).get(sheet_name)
+            yield {'text': self._sheet_text(sheet_name, df, stats, truncated),
+                   'completed': i + 1, 'total': len(excel_data)}
+        # One observation per workbook, like the PDF path's metric_extraction
+        self.metrics.observe_stage('metric_extraction_excel', metric_seconds)
+        return self._excel_metadata(uploaded_file, excel_data, sheet_metrics)
+
+    def _open_workbook(self, upload: SpooledUpload):
+        """Sheets of an Excel upload, streamed on demand for .xlsx in lazy mode"""
+        if self._lazy_workbook(upload):
+            return LazyWorkbook(upload, self.excel_memory_limit)
+        return pd.read_excel(upload.path, sheet_name=None)
+
+    def _lazy_workbook(self, uploaded_file) -> bool:
+        return self.lazy_excel and uploaded_file.name.lower().endswith('.xlsx')
+
+    def _cache_parsed(self, key: str, content: str, metadata: Dict[str, Any]):
+        """Store a parse. A lazy workbook moves onto a copy in the cache entry first, so the
+        pickle holds its path rather than the upload, and the cache size limit covers the file"""
+        if self.cache is None or not content:
+            return
+        try:
+            workbook = getattr(metadata.get('tables'), 'tables', None)
+            if (isinstance(workbook, LazyWorkbook) and isinstance(workbook.source, SpooledUpload)
+                    and workbook.source.temporary):
+                workbook.source = self.cache.store_file(key, 'workbook.xlsx', workbook.source.path)
+            self.cache.store(key, 'parsed', (content, metadata))
+        except OSError:
+            # A full or read-only cache directory must not fail the upload
+            pass
+
+    def _release_spool(self, upload: Optional[SpooledUpload], uploaded_file):
+        """Remove a spool this processor created, unless a lazy workbook still reads from it"""
+        if upload is None or upload is uploaded_file:
+            return
+        if self._lazy_workbook(upload):
+            # The workbook owns the spool now, its file goes when the workbook does or moves into the cache
+            return
+        upload.close()
+
+    def document_key(self, uploaded_file) -> str:
+        """Cache key from the file bytes and the processor version, hashed without copying them"""
+        if isinstance(uploaded_file, SpooledUpload):
+            return content_hash(PROCESSOR_VERSION, uploaded_file.view)
+        with uploaded_file.getbuffer() as buffer:
+            return content_hash(PROCESSOR_VERSION, buffer)
+
+    def _process_pdf(self, upload: SpooledUpload) -> Tuple[str, Dict[str, Any]]:
+        try:
+            with upload.open() as stream:
+                pdf_reader = PyPDF2.PdfReader(stream)
+                page_count = len(pdf_reader.pages)
+                page_texts = self._extract_pdf_pages(upload.path, pdf_reader, page_count)
 
-            metadata = {
-                'file_type': 'PDF',
-                'pages': len(pdf_reader.pages),
-                'file_size': len(uploaded_file.getvalue()),
-                'filename': uploaded_file.name
-            }
+            # Join once instead of repeated string concatenation
+            parts = []
+            for page_num, page_text in enumerate(page_texts):
+                parts.append(f"\n--- Page {page_num + 1} ---\n")
+                parts.append(page_text)
+            text_content = ''.join(parts)
 
-            # Extract financial metrics
-            financial_data = self._extract_financial_metrics(text_content)
-            metadata.update(financial_data)
+            metadata = self._pdf_metadata(upload, upload.size, page_count, text_content)
+            self._add_pdf_tables(metadata, upload.path, page_texts)
 
             return text_content, metadata
 
         except Exception as e:
             raise Exception(f"PDF processing error: {str(e)}")
 
+    def _pdf_metadata(self, uploaded_file, file_size: int, page_count: int, text_content: str) -> Dict[str, Any]:
+        metadata = {
+            'file_type': 'PDF',
+            'pages': page_count,
+            'file_size': file_size,
+            'filename': uploaded_file.name
+        }
+
+        # Extract financial metrics
+        financial_data = self._extract_financial_metrics(text_content)
+        metadata.update(financial_data)
+
+        return metadata
+
+    def _extract_pdf_pages(self, path: str, pdf_reader: PyPDF2.PdfReader, page_count: int) -> List[str]:
+        return [text for batch in self._pdf_page_batches(path, pdf_reader, page_count) for text in batch]
+
+    def _pdf_page_batches(self, path: str, pdf_reader: PyPDF2.PdfReader, page_count: int,
+                          batch_pages: Optional[int] = None) -> Iterator[List[str]]:
+        """Page texts in document order, in batches extracted on the shared process pool for large PDFs"""
+        if self.pdf_workers <= 1 or page_count < self.parallel_page_threshold:
+            for page in pdf_reader.pages:
+                yield [page.extract_text()]
+            return
+
+        # Contiguous ranges, at most one per worker since every task re-parses the file's
+        # cross-reference table; streaming callers cap them so pages arrive while the rest parse
+        range_size = max(1, -(-page_count // self.pdf_workers))
+        if batch_pages:
+            range_size = min(range_size, batch_pages)
+        ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+
+        done = 0
+        futures = []
+        try:
+            pool = _get_pdf_pool(self.pdf_workers)
+            futures = [pool.submit(_extract_pdf_page_range, path, start, stop) for start, stop in ranges]
+            for future in futures:
+                batch = future.result()
+                done += len(batch)
+                yield batch
+        except (BrokenProcessPool, OSError):
+            # Worker processes unavailable (sandboxed host, killed worker), extract the rest in-process
+            _reset_pdf_pool()
+            for page_num in range(done, page_count):
+                yield [pdf_reader.pages[page_num].extract_text()]
+        finally:
+            # A cancelled ingest stops here, queued ranges are dropped
+            for future in futures:
+                future.cancel()
+
+    def _add_pdf_tables(self, metadata: Dict[str, Any], path: str, page_texts: List[str]):
+        """Store the statement tables as typed DataFrames so table questions skip the model"""
+        if not self.pdf_tables:
+            return
+        try:
+            with self.metrics.span('table_extraction'):
+                # A statement reprinted on a later page would answer every question twice
+                tables = dedupe_tables(self._extract_pdf_tables(path, statement_pages(page_texts)))
+        except Exception:
+            # Tables are an extra; a layout pdfplumber cannot read must not fail the upload
+            return
+        if tables:
+            metadata['tables'] = TableStore(name_tables(tables), self.financial_keywords, source_label='table')
+            metadata['table_pages'] = sorted({table['page'] for table in tables})
+
+    def _extract_pdf_tables(self, path: str, pages: List[int]) -> List[Dict[str, Any]]:
+        if not pages:
+            return []
+        if self.pdf_workers <= 1 or len(pages) < self.parallel_table_threshold:
+            return extract_tables(path, pages)
+
+        # Interleaved pages spread a run of dense statement pages across every worker
+        workers = min(self.pdf_workers, len(pages))
+        groups = [pages[i::workers] for i in range(workers)]
+        try:
+            pool = _get_pdf_pool(self.pdf_workers)
+            futures = [pool.submit(extract_tables, path, group) for group in groups]
+            tables = []
+            for future in futures:
+                tables.extend(future.result())
+            return tables
+        except (BrokenProcessPool, OSError):
+            _reset_pdf_pool()
+            return extract_tables(path, pages)
+
     def _process_excel(self, uploaded_file) -> Tuple[str, Dict[str, Any]]:
         try:
-            # Read all sheets
-            excel_data = pd.read_excel(uploaded_file, sheet_name=None)
-            text_content = ""
-
-            for sheet_name, df in excel_data.items():
-                text_content += f"\n--- Sheet: {sheet_name} ---\n"
-                # Convert DataFrame to readable text
-                text_content += df.to_string(index=False)
-                text_content += "\n\n"
-
-                # Add summary statistics for numerical columns
-                numeric_cols = df.select_dtypes(include=['number']).columns
-                if len(numeric_cols) > 0:
-                    text_content += f"Numerical Summary for {sheet_name}:\n"
-                    text_content += df[numeric_cols].describe().to_string()
-                    text_content += "\n\n"
-
-            metadata = {
-                'file_type': 'Excel',
-                'sheets': list(excel_data.keys()),
-                'sheet_count': len(excel_data),
-                'file_size': len(uploaded_file.getvalue()),
-                'filename': uploaded_file.name
-            }
-
-            # Extract financial metrics
-            financial_data = self._extract_financial_metrics_from_excel(excel_data)
-            metadata.update(financial_data)
+            sections = self._iter_excel(uploaded_file)
+            parts = []
+            while True:
+                try:
+                    parts.append(next(sections)['text'])
+                except StopIteration as stop:
+                    metadata = stop.value
+                    break
 
-            return text_content, metadata
+            return ''.join(parts), metadata
 
         except Exception as e:
             raise Exception(f"Excel processing error: {str(e)}")
 
-    def _extract_financial_metrics(self, text: str) -> Dict[str, Any]:
-        metrics = {}
-        
-        # Pattern to find monetary values
-        money_pattern = r'[\$€£¥]?[\d,]+\.?\d*[MmKkBb]?'
-        
-        # Search for common financial terms with values
-        for keyword in self.financial_keywords:
-            pattern = rf'{keyword}[:\s]+({money_pattern})'
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                metrics[keyword] = matches
+    def _sheet_statistics(self, excel_data, sheet_name: str, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        # A truncated sheet's summary comes from every row, not just the loaded ones
+        full = getattr(excel_data, 'full_statistics', {}).get(sheet_name)
+        return full if full is not None else sheet_statistics(df)
+
+    def _sheet_text(self, sheet_name: str, df: pd.DataFrame, stats: Optional[pd.DataFrame],
+                    truncated: Optional[Dict[str, int]] = None) -> str:
+        parts = [f"\n--- Sheet: {sheet_name} ---\n"]
+        if truncated:
+            parts.append(f"(Only the first {truncated['loaded_rows']:,} of {truncated['total_rows']:,} rows "
+                         f"are listed; the numerical summary covers all rows)\n")
+        # Convert DataFrame to readable text
+        parts.append(df.to_string(index=False))
+        parts.append("\n\n")
+
+        # Add summary statistics for numerical columns
+        if stats is not None:
+            parts.append(f"Numerical Summary for {sheet_name}:\n")
+            parts.append(stats.to_string())
+            parts.append("\n\n")
 
-        # Extract years (for financial statements)
-        year_pattern = r'\b(20\d{2})\b'
-        years = list(set(re.findall(year_pattern, text)))
-        if years:
-            metrics['years'] = sorted(years, reverse=True)
+        return ''.join(parts)
 
-        return {'extracted_metrics': metrics}
+    def _excel_metadata(self, uploaded_file, excel_data, sheet_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = {
+            'file_type': 'Excel',
+            'sheets': list(excel_data.keys()),
+            'sheet_count': len(excel_data),
+            'file_size': uploaded_file.size,
+            'filename': uploaded_file.name,
+            # Structured copy of the sheets for deterministic aggregation questions
+            'tables': TableStore(excel_data, self.financial_keywords),
+            'sheet_metrics': sheet_metrics
+        }
+
+        truncated = getattr(excel_data, 'truncated_sheets', None)
+        if truncated:
+            metadata['truncated_sheets'] = dict(truncated)
+
+        return metadata
+
+    def _extract_financial_metrics(self, text: str) -> Dict[str, Any]:
+        # Single pass over the text for every keyword, amounts parsed to floats
+        with self.metrics.span('metric_extraction'):
+            return self.metric_extractor.extract(text)
 
     def _extract_financial_metrics_from_excel(self, excel_data: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
         metrics = {}
         
-        for sheet_name, df in excel_data.items():
-            sheet_metrics = {}
-            
-            # Look for financial keywords in column names
-            financial_columns = []
-            for col in df.columns:
-                if any(keyword in str(col).lower() for keyword in self.financial_keywords):
-                    financial_columns.append(col)
-            
-            if financial_columns:
-                sheet_metrics['financial_columns'] = financial_columns
-                
-                # Extract numerical summaries for financial columns
-                for col in financial_columns:
-                    if pd.api.types.is_numeric_dtype(df[col]):
-                        sheet_metrics[col] = {
-                            'sum': df[col].sum() if not df[col].isna().all() else 0,
-                            'mean': df[col].mean() if not df[col].isna().all() else 0,
-                            'max': df[col].max() if not df[col].isna().all() else 0,
-                            'min': df[col].min() if not df[col].isna().all() else 0
-                        }
-            
-            metrics[sheet_name] = sheet_metrics
+        with self.metrics.span('metric_extraction_excel'):
+            for sheet_name in excel_data:
+                df = excel_data[sheet_name]
+                metrics[sheet_name] = self._sheet_metrics(df, self._sheet_statistics(excel_data, sheet_name, df))
 
         return {'sheet_metrics': metrics}
 
+    def _sheet_metrics(self, df: pd.DataFrame, stats: Optional[pd.DataFrame]) -> Dict[str, Any]:
+        sheet_metrics = {}
+        
+        # Look for financial keywords in column names
+        financial_columns = []
+        for col in df.columns:
+            if any(keyword in str(col).lower() for keyword in self.financial_keywords):
+                financial_columns.append(col)
+        
+        if financial_columns:
+            sheet_metrics['financial_columns'] = financial_columns
+            
+            # Numerical summaries come from the precomputed statistics, all-empty columns report 0
+            for col in financial_columns:
+                if stats is not None and col in stats.columns:
+                    column_stats = stats[col]
+                    has_values = column_stats['count'] > 0
+                    sheet_metrics[col] = {
+                        name: column_stats[name] if has_values else 0
+                        for name in ('sum', 'mean', 'max', 'min')
+                    }
+        
+        return sheet_metrics
+
     def validate_file(self, uploaded_file) -> bool:
         if uploaded_file is None:
             return False
@@ -0,0 +1,220 @@
+import math
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from io import BytesIO
+from typing import Any, Iterator, List, Optional, Union
+
+import openpyxl
+import pandas as pd
+
+from utils.spool import SpooledUpload
+
+
+class LazyWorkbook(Mapping):
+    """Read-only .xlsx workbook that loads sheets into DataFrames on demand.
+
+    Rows are streamed with openpyxl's read-only mode. Loaded sheets are kept
+    in an LRU cache whose estimated size stays under ``memory_limit`` bytes,
+    and a single sheet larger than the limit is truncated rather than
+    loaded whole (see ``truncated_sheets``). The rows past the cut are
+    still streamed into ``full_statistics``, so summaries of a truncated
+    sheet cover all of it. A spooled source or a path is opened by path, so
+    the workbook bytes are never held in memory, and pickles carry the path.
+    """
+
+    def __init__(self, source: Union[bytes, str, SpooledUpload], memory_limit: int = 256 * 1024 * 1024):
+        self.source = source
+        self.memory_limit = memory_limit
+        self.truncated_sheets = {}
+        self.full_statistics = {}
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        # Opening a read-only workbook parses every sheet's dimensions, so one handle serves all loads
+        self._workbook = None
+        self._read_lock = threading.Lock()
+        with self._read_lock:
+            self._sheet_names = list(self._open().sheetnames)
+
+    def _open(self):
+        if self._workbook is None:
+            source = self.source
+            if isinstance(source, SpooledUpload):
+                source = source.path
+            elif isinstance(source, bytes):
+                source = BytesIO(source)
+            self._workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        return self._workbook
+
+    def close(self):
+        """Close the open workbook handle, the next sheet load reopens it"""
+        with self._read_lock:
+            if self._workbook is not None:
+                self._workbook.close()
+                self._workbook = None
+
+    def __getitem__(self, sheet_name: str) -> pd.DataFrame:
+        with self._lock:
+            if sheet_name in self._cache:
+                self._cache.move_to_end(sheet_name)
+                return self._cache[sheet_name][0]
+
+        if sheet_name not in self._sheet_names:
+            raise KeyError(sheet_name)
+
+        df = self._load_sheet(sheet_name)
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._cache[sheet_name] = (df, size)
+            self._cache_bytes += size
+            # Evict least recently used sheets, always keeping the one just loaded
+            while self._cache_bytes > self.memory_limit and len(self._cache) > 1:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted_size
+        return df
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sheet_names)
+
+    def __len__(self) -> int:
+        return len(self._sheet_names)
+
+    def _load_sheet(self, sheet_name: str) -> pd.DataFrame:
+        with self._read_lock:
+            rows = self._open()[sheet_name].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return pd.DataFrame()
+            columns = self._column_names(header)
+
+            records = []
+            max_rows = None
+            remainder = None
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                if len(row) < len(columns):
+                    row = tuple(row) + (None,) * (len(columns) - len(row))
+                row = row[:len(columns)]
+                if remainder is not None:
+                    remainder.add(row)
+                    continue
+                records.append(row)
+                if len(records) == 1000 and max_rows is None:
+                    max_rows = self._row_budget(records)
+                if max_rows is not None and len(records) >= max_rows:
+                    # Keep streaming for the aggregates, without holding the rows
+                    remainder = _RunningStatistics(len(columns))
+
+        df = pd.DataFrame.from_records(records, columns=columns)
+        # Blank columns come back as None objects, read_excel gives them float NaN
+        for col in df.columns[df.isna().all()]:
+            df[col] = df[col].astype(float)
+
+        if remainder is not None:
+            self.truncated_sheets[sheet_name] = {'loaded_rows': len(records),
+                                                 'total_rows': len(records) + remainder.rows}
+            self.full_statistics[sheet_name] = remainder.combine(df)
+        return df
+
+    def _column_names(self, header: tuple) -> List[Any]:
+        # Match pandas' naming for blank and duplicate header cells
+        columns = []
+        seen = {}
+        for i, value in enumerate(header):
+            name = value if value is not None else f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        return columns
+
+    def _row_budget(self, sample: List[tuple]) -> int:
+        # Estimate per-row cost from a sample so huge sheets stop before the ceiling
+        sample_bytes = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            for row in sample
+        )
+        bytes_per_row = max(1, sample_bytes // len(sample))
+        return max(len(sample), self.memory_limit // bytes_per_row)
+
+    def __getstate__(self):
+        # Loaded sheets, the workbook handle and the locks are rebuilt on demand after unpickling
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        state['_cache_bytes'] = 0
+        state['_workbook'] = None
+        del state['_lock']
+        del state['_read_lock']
+        if isinstance(self.source, SpooledUpload):
+            if self.source.temporary:
+                # Temporary spools go with this process. DocumentProcessor moves cached workbooks
+                # onto a file in the cache first, so only an uncached pickle copies the bytes
+                state['source'] = self.source.view.tobytes()
+            else:
+                state['source'] = self.source.path
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+
+class _RunningStatistics:
+    """Count, sum, sum of squares, min and max per column over rows that are not kept"""
+
+    def __init__(self, width: int):
+        self.rows = 0
+        self.count = [0] * width
+        self.sum = [0.0] * width
+        self.squares = [0.0] * width
+        self.min = [math.inf] * width
+        self.max = [-math.inf] * width
+
+    def add(self, row: tuple):
+        self.rows += 1
+        for i, value in enumerate(row):
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+                self.count[i] += 1
+                self.sum[i] += value
+                self.squares[i] += value * value
+                if value < self.min[i]:
+                    self.min[i] = value
+                if value > self.max[i]:
+                    self.max[i] = value
+
+    def combine(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """Statistics of the loaded rows plus the streamed remainder, shaped like sheet_statistics"""
+        numeric = df.select_dtypes(include=['number'])
+        if numeric.shape[1] == 0:
+            return None
+        positions = {col: i for i, col in enumerate(df.columns)}
+        result = {}
+        for col in numeric.columns:
+            i = positions[col]
+            values = numeric[col].dropna()
+            count = len(values) + self.count[i]
+            total = float(values.sum()) + self.sum[i]
+            squares = float((values * values).sum()) + self.squares[i]
+            low = min(self.min[i], float(values.min()) if len(values) else math.inf)
+            high = max(self.max[i], float(values.max()) if len(values) else -math.inf)
+            mean = total / count if count else math.nan
+            variance = (squares - total * mean) / (count - 1) if count > 1 else math.nan
+            result[col] = {
+                'count': count, 'sum': total, 'mean': mean, 'std': math.sqrt(max(variance, 0.0)),
+                'min': low if count else math.nan, 'max': high if count else math.nan,
+            }
+        return pd.DataFrame(result, index=['count', 'sum', 'mean', 'std', 'min', 'max'])
+
+
+def sheet_statistics(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Summary statistics for every numeric column, computed in one vectorised call"""
+    numeric = df.select_dtypes(include=['number'])
+    if numeric.shape[1] == 0:
+        return None
+    return numeric.agg(['count', 'sum', 'mean', 'std', 'min', 'max'])
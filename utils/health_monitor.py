@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from utils.ollama_client import OllamaClient
+
+
+def _is_connect_failure(error: Exception) -> bool:
+    """True when a request never reached the server: refused, unresolvable or timed out connecting"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the last underlying error
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    # urllib3's NewConnectionError (refused, DNS) is a ConnectTimeoutError subclass
+    return isinstance(reason, (ConnectTimeoutError, ConnectionRefusedError))
+
+
+class OllamaHealthMonitor:
+    """Shared, TTL-cached view of an Ollama server's connection and model state.
+
+    A single ``/api/tags`` call answers both the connection and the model
+    checks. Stale snapshots are served immediately while a background thread
+    refreshes them, so callers only block when no snapshot exists yet.
+    """
+
+    def __init__(self, ollama_url: str, ttl: float = 15.0, timeout: float = 5.0,
+                 client: Optional[OllamaClient] = None):
+        self.ollama_url = ollama_url
+        self.client = client or OllamaClient(ollama_url)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshing = False
+
+    def status(self, block: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            snapshot = self._snapshot
+            stale = snapshot is None or time.monotonic() - snapshot['checked_at'] > self.ttl
+            start_refresh = stale and snapshot is not None and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+
+        if start_refresh:
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+
+        if snapshot is None and block:
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self) -> Dict[str, Any]:
+        connected = False
+        models = set()
+        try:
+            response = self.client.get("/api/tags", read_timeout=self.timeout)
+            if response.status_code == 200:
+                connected = True
+                models = {model['name'] for model in response.json().get('models', [])}
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+
+        return self._publish(connected, models)
+
+    def _refresh_soon(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _publish(self, connected: bool, models: set) -> Dict[str, Any]:
+        snapshot = {'connected': connected, 'models': frozenset(models), 'checked_at': time.monotonic()}
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def is_connected(self) -> bool:
+        return self.status()['connected']
+
+    def has_model(self, model_name: str) -> bool:
+        snapshot = self.status()
+        return snapshot['connected'] and model_name in snapshot['models']
+
+    # Outcomes observed on real traffic keep the snapshot current between refreshes
+
+    def record_success(self, model_name: str):
+        with self._lock:
+            models = set(self._snapshot['models']) if self._snapshot else set()
+        models.add(model_name)
+        self._publish(True, models)
+
+    def record_failure(self, error: Optional[Exception] = None):
+        """A connection that could not be made marks the server down until the next refresh.
+
+        Other failures (a reset mid-response, a busy server hanging up) only
+        re-probe it at once, so one dropped request does not take it out of
+        rotation for the whole TTL.
+        """
+        if error is None or _is_connect_failure(error):
+            self._publish(False, set())
+        else:
+            self._refresh_soon()
+
+    def record_model_missing(self, model_name: str):
+        with self._lock:
+            models = set(self._snapshot['models']) if self._snapshot else set()
+        models.discard(model_name)
+        self._publish(True, models)
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_health_monitor(ollama_url: str, client: Optional[OllamaClient] = None) -> OllamaHealthMonitor:
+    """Return the process-wide monitor for an Ollama URL, shared across sessions"""
+    with _monitors_lock:
+        if ollama_url not in _monitors:
+            _monitors[ollama_url] = OllamaHealthMonitor(ollama_url, client=client)
+        return _monitors[ollama_url]
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from utils.metrics import get_metrics
+from utils.retriever import BM25Retriever, Retriever, chunk_document
+
+
+class IngestJob(Retriever):
+    """Parses a document on a background thread and indexes sections as they arrive.
+
+    The job doubles as a retriever so questions can be answered against the
+    pages indexed so far while the rest of the document is still parsing.
+    """
+
+    def __init__(self, document_processor, uploaded_file):
+        self.document_processor = document_processor
+        self.uploaded_file = uploaded_file
+        self.filename = uploaded_file.name
+        self.index = BM25Retriever()
+        self.metadata = None
+        self.error = None
+        self.completed = 0
+        self.total = 0
+        self._parts = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'IngestJob':
+        self._thread.start()
+        return self
+
+    def _run(self):
+        metrics = get_metrics()
+        started = time.perf_counter()
+        try:
+            for section in self.document_processor.iter_document(self.uploaded_file):
+                if self._cancelled.is_set():
+                    return
+                if not self.completed:
+                    # How long until the chat can open
+                    metrics.observe_stage('ingest_first_section', time.perf_counter() - started)
+                chunks = chunk_document(section['text']) if section['text'] else []
+                with self._lock:
+                    if section['text']:
+                        self._parts.append(section['text'])
+                        self.index.add_chunks(chunks)
+                    self.completed = section['completed']
+                    self.total = section['total']
+                    if 'metadata' in section:
+                        self.metadata = section['metadata']
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+        finally:
+            metrics.observe_stage('ingest', time.perf_counter() - started)
+            # Release the upload buffer once parsing is over
+            self.uploaded_file = None
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.metadata is not None or self.error is not None
+
+    @property
+    def ready(self) -> bool:
+        """True once at least one section is indexed and questions can be answered"""
+        return len(self.index) > 0
+
+    @property
+    def progress(self) -> float:
+        if self.finished:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+    def content(self) -> str:
+        with self._lock:
+            return ''.join(self._parts)
+
+    @property
+    def chunks(self) -> List[Dict[str, Any]]:
+        return self.index.chunks
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        # The index is mutated by the worker thread, so searches take the same lock
+        with self._lock:
+            return self.index.search(query, top_k)
+
+    def build_context(self, query: str, max_chars: int = 3000, top_k: int = 8,
+                      measure: Callable[[str], int] = len) -> str:
+        with self._lock:
+            return self.index.build_context(query, max_chars, top_k, measure)
+
+    def __len__(self) -> int:
+        return len(self.index)
@@ -0,0 +1,120 @@
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+# Pattern to find monetary values
+MONEY_PATTERN = r'[\$€£¥]?[\d,]+\.?\d*[MmKkBb]?'
+YEAR_PATTERN = re.compile(r'\b(20\d{2})\b')
+PAGE_PATTERN = re.compile(r'^--- Page (\d+) ---$', re.MULTILINE)
+
+CURRENCIES = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY'}
+SCALES = {'k': 1e3, 'm': 1e6, 'b': 1e9}
+
+
+def parse_money(raw: str) -> Dict[str, Any]:
+    """Normalise a matched amount such as "$1,234.5M" into a float with currency and scale applied"""
+    text = raw.strip()
+    currency = CURRENCIES.get(text[:1])
+    if currency:
+        text = text[1:]
+
+    scale = 1.0
+    if text[-1:].lower() in SCALES:
+        scale = SCALES[text[-1].lower()]
+        text = text[:-1]
+
+    digits = text.replace(',', '')
+    try:
+        value = float(digits) * scale if any(ch.isdigit() for ch in digits) else None
+    except ValueError:
+        value = None
+
+    return {'value': value, 'currency': currency, 'scale': scale}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Regex for a set of literal words with shared prefixes factored out (a keyword automaton)"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = ['' if ch == '' else re.escape(ch) + build(child) for ch, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+
+class FinancialMetricExtractor:
+    """Finds keyword/amount pairs and years in a single pass over the document text.
+
+    All keywords are compiled into one prefix-factored pattern that runs over
+    the lowercased text, so the cost is linear in the text length no matter
+    how many keywords are tracked.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = [keyword.lower() for keyword in keywords]
+        first_chars = ''.join(sorted({keyword[0] for keyword in self.keywords} | {'2'}))
+        source = (
+            rf'(?=[{re.escape(first_chars)}])'
+            rf'(?:(?P<year>\b20\d{{2}}\b)|(?P<keyword>{_trie_pattern(self.keywords)})[:\s]+(?P<value>{MONEY_PATTERN}))'
+        )
+        self.pattern = re.compile(source)
+        self.pattern_ignorecase = re.compile(source, re.IGNORECASE)
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        page_offsets = []
+        page_numbers = []
+        for match in PAGE_PATTERN.finditer(text):
+            page_offsets.append(match.start())
+            page_numbers.append(int(match.group(1)))
+
+        raw_matches = {}
+        values = []
+        years = set()
+
+        # Lowercasing keeps offsets aligned for almost all text; a few Unicode
+        # characters change length, and those documents use the slower flag instead
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            matches = self.pattern.finditer(lowered)
+        else:
+            matches = self.pattern_ignorecase.finditer(text)
+
+        for match in matches:
+            if match.group('year'):
+                years.add(match.group('year'))
+                continue
+
+            keyword = match.group('keyword').lower()
+            raw = text[match.start('value'):match.end('value')]
+            raw_matches.setdefault(keyword, []).append(raw)
+            # Years inside a matched amount are still reported, as with a separate scan;
+            # one character of context each side keeps the word boundaries exact
+            years.update(YEAR_PATTERN.findall(text, max(0, match.start('value') - 1), match.end('value') + 1))
+
+            record = {
+                'keyword': keyword,
+                'raw': raw,
+                'offset': match.start('value'),
+                'page': self._page_for(match.start(), page_offsets, page_numbers)
+            }
+            record.update(parse_money(raw))
+            values.append(record)
+
+        # Keep the configured keyword order for display
+        metrics = {keyword: raw_matches[keyword] for keyword in self.keywords if keyword in raw_matches}
+        if years:
+            metrics['years'] = sorted(years, reverse=True)
+
+        return {'extracted_metrics': metrics, 'metric_values': values}
+
+    def _page_for(self, offset: int, page_offsets: List[int], page_numbers: List[int]) -> Optional[int]:
+        position = bisect_right(page_offsets, offset) - 1
+        return page_numbers[position] if position >= 0 else None
@@ -0,0 +1,207 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+# Seconds, from sub-millisecond retrieval up to slow CPU generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+METRIC_PREFIX = "financial_qa"
+
+logger = logging.getLogger('financial_qa.metrics')
+
+
+class Histogram:
+    """Cumulative bucket counts for export plus a window of recent samples for percentiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+
+class Span:
+    """A running stage timing; time spent inside ``paused()`` is left out"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.paused_seconds = 0.0
+
+    @contextmanager
+    def paused(self):
+        paused_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.paused_seconds += time.perf_counter() - paused_at
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started - self.paused_seconds
+
+
+class MetricsRegistry:
+    """Process-wide timings and counters for the upload and ask pipelines.
+
+    Stage durations go to one ``stage_seconds`` histogram labelled by stage,
+    Ollama's own timings and token counts are recorded per generation, and
+    everything can be exported as Prometheus text or a JSON snapshot. When a
+    log path is configured each observation is also written as a JSON line.
+    """
+
+    def __init__(self, log_path: Optional[str] = None):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        if log_path:
+            handler = logging.FileHandler(log_path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def _histogram(self, name: str, labels: Tuple, buckets: Tuple[float, ...]) -> Histogram:
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        return histogram
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            self._histogram(name, tuple(sorted(labels.items())), buckets).observe(value)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'ts': time.time(), 'metric': name, 'value': value, **labels}))
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.observe('stage_seconds', seconds, stage=stage)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the block as one observation of the stage, whether or not it raises.
+
+        Yields the Span, so a generator can leave out the time its consumer
+        holds it with ``span.paused()``.
+        """
+        span = Span()
+        try:
+            yield span
+        finally:
+            self.observe_stage(stage, span.elapsed())
+
+    def record_generation(self, model: str, result: Dict[str, Any]):
+        """Ollama's timings from a final /api/generate response (durations are nanoseconds)"""
+        for field, stage in (('load_duration', 'model_load'), ('prompt_eval_duration', 'prompt_eval'),
+                             ('eval_duration', 'generation'), ('total_duration', 'ollama_total')):
+            if result.get(field):
+                self.observe_stage(stage, result[field] / 1e9)
+
+        prompt_tokens = result.get('prompt_eval_count') or 0
+        output_tokens = result.get('eval_count') or 0
+        self.increment('prompt_tokens_total', prompt_tokens, model=model)
+        self.increment('output_tokens_total', output_tokens, model=model)
+        if prompt_tokens and result.get('prompt_eval_duration'):
+            self.observe('tokens_per_second', prompt_tokens / (result['prompt_eval_duration'] / 1e9),
+                         RATE_BUCKETS, model=model, phase='prompt')
+        if output_tokens and result.get('eval_duration'):
+            self.observe('tokens_per_second', output_tokens / (result['eval_duration'] / 1e9),
+                         RATE_BUCKETS, model=model, phase='generation')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = [
+                dict(metric=name, labels=dict(labels), **histogram.summary())
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {'metric': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {'histograms': histograms, 'counters': counters}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} histogram")
+                    seen.add(metric)
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide registry; set FINANCIAL_QA_METRICS_LOG to also write JSON lines to a file"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry(os.environ.get('FINANCIAL_QA_METRICS_LOG'))
+        return _metrics
@@ -0,0 +1,139 @@
+import socket
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Abort handle of the request the current thread is sending, see OllamaClient.post
+_sending = threading.local()
+
+
+class AbortHandle:
+    """Lets another thread cut off a request while it waits for or reads the response.
+
+    Shutting the socket down makes Ollama drop the generation and wakes the
+    reading thread, which sees a ConnectionError and can check ``aborted``.
+    """
+
+    def __init__(self):
+        self.aborted = False
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            connection = self._connection
+        # A pooled connection may have moved on to another request since
+        sock = connection.sock if connection is not None and connection.abort_handle is self else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _attach(self, connection):
+        with self._lock:
+            self._connection = connection
+            aborted = self.aborted
+        if aborted:
+            raise requests.exceptions.ConnectionError("Request aborted")
+
+
+class _AbortableMixin:
+    abort_handle = None
+
+    def request(self, *args, **kwargs):
+        handle = getattr(_sending, 'handle', None)
+        self.abort_handle = handle
+        if handle is not None:
+            handle._attach(self)
+        return super().request(*args, **kwargs)
+
+
+class _AbortableHTTPConnection(_AbortableMixin, HTTPConnection):
+    pass
+
+
+class _AbortableHTTPSConnection(_AbortableMixin, HTTPSConnection):
+    pass
+
+
+class _AbortableHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _AbortableHTTPConnection
+
+
+class _AbortableHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _AbortableHTTPSConnection
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _AbortableHTTPPool, 'https': _AbortableHTTPSPool}
+
+
+def get_shared_session(pool_size: int = 32, retries: int = 2, backoff_factor: float = 0.5) -> requests.Session:
+    """Return a process-wide pooled session so all Streamlit sessions reuse keep-alive sockets"""
+    key = (pool_size, retries, backoff_factor)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # Retry connection failures and overloaded-server responses, but never
+            # re-read a generation that already started (read=0)
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=0,
+                status=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False
+            )
+            adapter = _AbortableAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+class OllamaClient:
+    """Thin HTTP layer for Ollama with pooled connections and split timeouts"""
+
+    def __init__(self, base_url: str = "http://localhost:11434", pool_size: int = 32,
+                 connect_timeout: float = 3.05, read_timeout: float = 180,
+                 retries: int = 2, backoff_factor: float = 0.5):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = get_shared_session(pool_size, retries, backoff_factor)
+
+    def get(self, path: str, read_timeout: Optional[float] = None) -> requests.Response:
+        return self.session.get(
+            f"{self.base_url}{path}",
+            timeout=(self.connect_timeout, read_timeout or self.read_timeout)
+        )
+
+    def post(self, path: str, payload: Dict[str, Any], stream: bool = False,
+             read_timeout: Optional[float] = None, abort: Optional[AbortHandle] = None) -> requests.Response:
+        """POST to Ollama; ``abort`` lets another thread cut the request off, including a streamed body"""
+        _sending.handle = abort
+        try:
+            return self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                stream=stream,
+                timeout=(self.connect_timeout, read_timeout or self.read_timeout)
+            )
+        finally:
+            _sending.handle = None
@@ -0,0 +1,127 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from utils.health_monitor import OllamaHealthMonitor, get_health_monitor
+from utils.ollama_client import OllamaClient
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+
+def configured_urls() -> List[str]:
+    """Ollama endpoints from OLLAMA_URLS (comma separated), or the local default"""
+    urls = [url.strip() for url in os.environ.get('OLLAMA_URLS', '').split(',') if url.strip()]
+    return urls or [DEFAULT_OLLAMA_URL]
+
+
+class OllamaNode:
+    """One Ollama endpoint: its client, shared health monitor and in-flight request count"""
+
+    def __init__(self, client: OllamaClient, health: Optional[OllamaHealthMonitor] = None):
+        self.client = client
+        self.url = client.base_url
+        self.health = health or get_health_monitor(self.url, client)
+        self.outstanding = 0
+        self.dispatched = 0
+
+    def serves(self, model_name: str) -> bool:
+        """False only when the last health snapshot rules the node out"""
+        snapshot = self.health.status(block=False)
+        if snapshot is None:
+            return True
+        return snapshot['connected'] and model_name in snapshot['models']
+
+
+class OllamaRouter:
+    """Spreads generations over several Ollama endpoints.
+
+    Each request goes to the healthy node serving the model with the fewest
+    requests in flight, ties going to the node used least recently. Callers
+    retry on another node via ``exclude`` when one fails or times out. With
+    one endpoint it behaves exactly like talking to that server directly.
+    """
+
+    def __init__(self, nodes: Sequence[OllamaNode]):
+        if not nodes:
+            raise ValueError("OllamaRouter needs at least one node")
+        self.nodes = list(nodes)
+        self._lock = threading.Lock()
+        self._dispatches = 0
+
+    @classmethod
+    def from_urls(cls, urls: Sequence[str], **client_options) -> 'OllamaRouter':
+        return cls([OllamaNode(OllamaClient(url, **client_options)) for url in urls])
+
+    @property
+    def primary(self) -> OllamaNode:
+        return self.nodes[0]
+
+    def candidates(self, model_name: str, exclude: Sequence[OllamaNode] = ()) -> List[OllamaNode]:
+        remaining = [node for node in self.nodes if node not in exclude]
+        healthy = [node for node in remaining if node.serves(model_name)]
+        # When every node looks down, still try them; the snapshot may be stale
+        return healthy or remaining
+
+    @contextmanager
+    def route(self, model_name: str, exclude: Sequence[OllamaNode] = ()) -> Iterator[OllamaNode]:
+        """Hold the least loaded node for the duration of one request"""
+        candidates = self.candidates(model_name, exclude)
+        if not candidates:
+            raise LookupError("No Ollama node left to try")
+        with self._lock:
+            node = min(candidates, key=lambda candidate: (candidate.outstanding, candidate.dispatched))
+            node.outstanding += 1
+            self._dispatches += 1
+            node.dispatched = self._dispatches
+        try:
+            yield node
+        finally:
+            with self._lock:
+                node.outstanding -= 1
+
+    def status(self, block: bool = True) -> Optional[Dict[str, Any]]:
+        """Combined health: connected if any node is, with the models of every connected node"""
+        snapshots = [node.health.status(block=False) for node in self.nodes]
+        missing = [node for node, snapshot in zip(self.nodes, snapshots) if snapshot is None]
+        if block and missing:
+            # First checks run side by side so one dead node does not delay the rest
+            with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                refreshed = iter(list(pool.map(lambda node: node.health.refresh(), missing)))
+            snapshots = [snapshot if snapshot is not None else next(refreshed) for snapshot in snapshots]
+        known = [snapshot for snapshot in snapshots if snapshot is not None]
+        connected = [snapshot for snapshot in known if snapshot['connected']]
+        if not connected and len(known) < len(snapshots):
+            # Nodes not checked yet may still be up
+            return None
+        return {
+            'connected': bool(connected),
+            'models': frozenset().union(*(snapshot['models'] for snapshot in connected)),
+            'nodes_online': len(connected),
+            'nodes_total': len(self.nodes),
+        }
+
+    def is_connected(self) -> bool:
+        return self.status()['connected']
+
+    def has_model(self, model_name: str) -> bool:
+        snapshot = self.status()
+        return snapshot['connected'] and model_name in snapshot['models']
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'url': node.url, 'outstanding': node.outstanding} for node in self.nodes]
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(urls: Optional[Sequence[str]] = None) -> OllamaRouter:
+    """Process-wide router per endpoint list, so in-flight counts cover every session"""
+    key = tuple(urls or configured_urls())
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = OllamaRouter.from_urls(key)
+        return _routers[key]
@@ -0,0 +1,203 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+import pdfplumber
+
+# Phrases that identify each statement, matched against the table's text and page heading
+STATEMENT_PHRASES = {
+    'Balance sheet': (
+        'balance sheet', 'financial position', 'total assets', 'total liabilities', 'current assets',
+        'current liabilities', 'shareholders equity', "shareholders' equity", 'stockholders equity',
+        "stockholders' equity", 'retained earnings', 'property, plant and equipment',
+    ),
+    'Income statement': (
+        'income statement', 'statement of operations', 'statements of operations', 'profit or loss',
+        'revenue', 'net sales', 'cost of revenue', 'cost of sales', 'gross profit', 'operating income',
+        'operating expenses', 'net income', 'earnings per share', 'income before',
+    ),
+    'Cash flow statement': (
+        'cash flow', 'cash flows', 'operating activities', 'investing activities', 'financing activities',
+        'capital expenditure', 'cash and cash equivalents at', 'net increase in cash', 'net decrease in cash',
+    ),
+}
+
+# A table needs this many distinct phrases before it counts as a statement
+MIN_PHRASE_HITS = 2
+# Statements show comparative periods, so their lines carry two or more amounts
+MIN_TABULAR_LINES = 4
+AMOUNT_TOKEN = re.compile(r'\(?[\$€£¥]?\d[\d,]*(?:\.\d+)?\)?')
+
+# Ruled tables first; statements laid out with whitespace only need the text strategy
+TABLE_SETTINGS = (
+    None,
+    {'vertical_strategy': 'text', 'horizontal_strategy': 'text', 'min_words_vertical': 2},
+)
+
+NUMBER_PATTERN = re.compile(r'^\(?-?[\$€£¥]?\s*\(?-?\d[\d,]*(?:\.\d+)?\)?%?$')
+DASHES = frozenset(['-', '—', '–', '$ -', '$-', 'nil', 'n/a', ''])
+YEAR_PATTERN = re.compile(r'\b(?:19|20)\d{2}\b')
+# Running page numbers in a statement title ("... - Page 12", "F-4")
+PAGE_NUMBER_PATTERN = re.compile(r'\s*[-–|]?\s*\b(?:page\s+\d+|[a-z]-\d+)\b', re.IGNORECASE)
+
+
+def statement_pages(page_texts: Sequence[str]) -> List[int]:
+    """Zero-based pages that read like a statement, the only ones worth handing to pdfplumber"""
+    pages = []
+    for index, text in enumerate(page_texts):
+        lowered = text.lower()
+        hits = sum(phrase in lowered for phrases in STATEMENT_PHRASES.values() for phrase in phrases)
+        if hits < MIN_PHRASE_HITS:
+            continue
+        tabular = sum(len(AMOUNT_TOKEN.findall(line)) >= 2 for line in text.splitlines())
+        if tabular >= MIN_TABULAR_LINES:
+            pages.append(index)
+    return pages
+
+
+def classify_table(text: str) -> Optional[str]:
+    """Statement type with the most phrase hits, or None when no type has enough"""
+    lowered = text.lower()
+    best, best_hits = None, 0
+    for statement, phrases in STATEMENT_PHRASES.items():
+        hits = sum(phrase in lowered for phrase in phrases)
+        if hits > best_hits:
+            best, best_hits = statement, hits
+    return best if best_hits >= MIN_PHRASE_HITS else None
+
+
+def parse_number(cell: Any) -> Optional[float]:
+    """Statement cell to float: "(1,234)" is negative, dashes and blanks are missing"""
+    if cell is None:
+        return None
+    text = str(cell).strip().replace('\n', ' ')
+    if text.lower() in DASHES or not NUMBER_PATTERN.match(text):
+        return None
+    negative = '(' in text or text.lstrip('$€£¥ ').startswith('-')
+    digits = re.sub(r'[^\d.]', '', text)
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _is_data_row(row: List[Any]) -> bool:
+    values = [str(cell).strip() for cell in row[1:] if cell not in (None, '')]
+    if not row[0] or not values:
+        return False
+    if all(YEAR_PATTERN.fullmatch(value) for value in values):
+        return False
+    return any(parse_number(value) is not None for value in values)
+
+
+def _column_names(header: List[Any], width: int) -> List[str]:
+    names = []
+    seen = set()
+    for i in range(width):
+        name = str(header[i]).strip().replace('\n', ' ') if i < len(header) and header[i] else ''
+        if i == 0:
+            name = name or 'Line item'
+        name = name or f"Column {i}"
+        while name in seen:
+            name = f"{name}.{i}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def table_frame(rows: List[List[Any]]) -> Optional[pd.DataFrame]:
+    """Typed DataFrame from extracted rows: a text line-item column and float period columns"""
+    rows = [row for row in rows if row and any(cell not in (None, '') for cell in row)]
+    if len(rows) < 2:
+        return None
+    width = max(len(row) for row in rows)
+    rows = [list(row) + [None] * (width - len(row)) for row in rows]
+
+    # Data starts at the first labelled row with amounts; the header is the last row above
+    # it with anything in the value columns (typically "2023 | 2022"), titles above that go
+    start = next((i for i, row in enumerate(rows) if _is_data_row(row)), None)
+    if start is None:
+        return None
+    header = next((row for row in reversed(rows[:start]) if any(cell for cell in row[1:])), [])
+    body = rows[start:]
+
+    columns = _column_names(header, width)
+    records = []
+    for row in body:
+        label = str(row[0] or '').strip().replace('\n', ' ')
+        values = [parse_number(cell) for cell in row[1:]]
+        if label and any(value is not None for value in values):
+            records.append([label] + values)
+    if not records:
+        return None
+
+    df = pd.DataFrame.from_records(records, columns=columns)
+    numeric = df.columns[1:]
+    df[numeric] = df[numeric].astype(float)
+    # Columns that never held a number are layout artefacts
+    df = df.drop(columns=[col for col in numeric if df[col].isna().all()])
+    if df.shape[1] < 2:
+        return None
+    df[df.columns[0]] = df[df.columns[0]].astype('string')
+    return df
+
+
+def _title(heading: str) -> str:
+    first_line = next((line.strip() for line in heading.splitlines() if line.strip()), '')
+    return PAGE_NUMBER_PATTERN.sub('', first_line).strip().lower()
+
+
+def extract_page_tables(page, page_number: int) -> List[Dict[str, Any]]:
+    heading = (page.extract_text() or '')[:300]
+    for settings in TABLE_SETTINGS:
+        found = []
+        for rows in page.extract_tables(settings):
+            df = table_frame(rows)
+            if df is None:
+                continue
+            labels = ' '.join(df[df.columns[0]].astype(str))
+            statement = classify_table(f"{heading}\n{labels}")
+            if statement is not None:
+                found.append({'statement': statement, 'page': page_number, 'frame': df, 'title': _title(heading)})
+        if found:
+            return found
+    return []
+
+
+def extract_tables(path: str, pages: Sequence[int]) -> List[Dict[str, Any]]:
+    """Statement tables on the given zero-based pages; safe to run in a worker process"""
+    tables = []
+    with pdfplumber.open(path) as pdf:
+        for index in pages:
+            page = pdf.pages[index]
+            tables.extend(extract_page_tables(page, index + 1))
+            # pdfplumber caches layout objects per page, release them as we go
+            page.close()
+    return tables
+
+
+def dedupe_tables(tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop statements reprinted on later pages: same title, periods and line items as an earlier one"""
+    unique = []
+    seen = set()
+    for table in sorted(tables, key=lambda table: table['page']):
+        frame = table['frame']
+        key = (table['statement'], table.get('title', ''), tuple(frame.columns[1:]),
+               tuple(frame[frame.columns[0]].astype(str)))
+        if key not in seen:
+            seen.add(key)
+            unique.append(table)
+    return unique
+
+
+def name_tables(tables: List[Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
+    """Tables keyed by statement and page, e.g. "Income statement (page 12)" """
+    named = {}
+    counts = {}
+    for table in sorted(tables, key=lambda table: table['page']):
+        key = (table['statement'], table['page'])
+        counts[key] = counts.get(key, 0) + 1
+        suffix = f", table {counts[key]}" if counts[key] > 1 else ""
+        named[f"{table['statement']} (page {table['page']}{suffix})"] = table['frame']
+    return named
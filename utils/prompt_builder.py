@@ -0,0 +1,137 @@
+import re
+from typing import Dict, Optional
+
+PROMPT_INSTRUCTIONS = """You are a professional financial analyst assistant. Analyze the financial document content provided and answer questions accurately and concisely.
+
+INSTRUCTIONS:
+1. Answer based ONLY on the information in the provided document
+2. If the information is not in the document, clearly state that
+3. Provide specific numbers and figures when available
+4. Use professional financial terminology
+5. Be concise but comprehensive
+6. Format numbers properly (use commas for thousands, proper currency symbols)
+7. If asked about trends, compare different periods if data is available"""
+
+TRUNCATION_MARKER = "...[content truncated]"
+
+# About four characters per token for English prose; SentencePiece models such
+# as gemma split numbers into single digits, which dominate financial text
+CHARS_PER_TOKEN = 4
+DIGIT_PATTERN = re.compile(r'\d')
+
+# Output token budgets, checked in order; the first matching type wins
+QUESTION_TYPES = [
+    ('summary', re.compile(r'\b(?:summar\w*|overview|highlights?|key)\b')),
+    ('compare', re.compile(r'\b(?:compare\w*|comparison|trends?|versus|vs|growth|changed?|performance)\b')),
+    ('explain', re.compile(r'\b(?:why|explain\w*|describe|breakdown|categories|items|situation)\b')),
+    ('lookup', re.compile(r'\b(?:what|how much|how many|which|when)\b')),
+]
+
+ANSWER_BUDGETS = {
+    'lookup': 128,
+    'explain': 320,
+    'compare': 320,
+    'summary': 400,
+    'default': 256,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count without loading the model's tokenizer"""
+    if not text:
+        return 0
+    digits = len(DIGIT_PATTERN.findall(text))
+    return digits + (len(text) - digits + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def fit_tokens(text: str, max_tokens: int, marker: str = TRUNCATION_MARKER) -> str:
+    """Cut text so it fits in max_tokens, marking the cut"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(marker)
+    if budget <= 0:
+        return ""
+
+    # Longest prefix within budget; the estimate grows monotonically with length
+    low, high = 0, min(len(text), budget * CHARS_PER_TOKEN)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + marker
+
+
+class PromptAssembler:
+    """Builds prompts that fit a model's context window.
+
+    The window (``num_ctx``) is split between the fixed instructions, the
+    question, the answer (``num_predict``, chosen per question type), the
+    conversation context (at most ``context_share`` of what is left) and the
+    document excerpt, which gets the remainder.
+    """
+
+    def __init__(self, num_ctx: int = 2048, instructions: str = PROMPT_INSTRUCTIONS,
+                 answer_budgets: Optional[Dict[str, int]] = None, context_share: float = 0.25,
+                 reserve_tokens: int = 32):
+        self.num_ctx = num_ctx
+        self.instructions = instructions
+        self.answer_budgets = dict(ANSWER_BUDGETS, **(answer_budgets or {}))
+        self.context_share = context_share
+        # Headroom for the estimate being low and for the template's own tokens
+        self.reserve_tokens = reserve_tokens
+        self._instruction_tokens = estimate_tokens(self._template("", "", ""))
+
+    def question_type(self, question: str) -> str:
+        text = question.lower()
+        for name, pattern in QUESTION_TYPES:
+            if pattern.search(text):
+                return name
+        return 'default'
+
+    def answer_budget(self, question: str) -> int:
+        return self.answer_budgets[self.question_type(question)]
+
+    def prompt_budget(self, question: str) -> int:
+        """Tokens available for the document excerpt and the conversation context"""
+        used = self._instruction_tokens + estimate_tokens(question) + self.answer_budget(question)
+        return max(0, self.num_ctx - used - self.reserve_tokens)
+
+    def context_budget(self) -> int:
+        """Conversation tokens that fit beside any question type's answer budget"""
+        worst = self.num_ctx - self._instruction_tokens - max(self.answer_budgets.values()) - self.reserve_tokens
+        return max(0, int(worst * self.context_share))
+
+    def document_budget(self, question: str, context: str = "") -> int:
+        budget = self.prompt_budget(question)
+        context_tokens = min(estimate_tokens(context), int(budget * self.context_share))
+        return budget - context_tokens
+
+    def assemble(self, question: str, document_content: str, context: str = "") -> Dict:
+        """Prompt with the excerpt and conversation context cut to their token budgets"""
+        budget = self.prompt_budget(question)
+        context = fit_tokens(context, int(budget * self.context_share), "...")
+        document_content = fit_tokens(document_content, budget - estimate_tokens(context))
+        prompt = self._template(question, document_content, context)
+        return {
+            'prompt': prompt,
+            'excerpt': document_content,
+            'num_predict': self.answer_budget(question),
+            'prompt_tokens': estimate_tokens(prompt),
+        }
+
+    def _template(self, question: str, document_content: str, context: str) -> str:
+        # Fixed instructions first and the document next, so consecutive prompts share
+        # the longest possible prefix and Ollama can reuse its evaluated prompt cache
+        return f"""{self.instructions}
+
+FINANCIAL DOCUMENT CONTENT:
+{document_content}
+
+CONVERSATION CONTEXT:
+{context}
+
+USER QUESTION: {question}
+
+ANSWER:"""
@@ -1,108 +1,436 @@
 import requests
 import json
 import streamlit as st
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from utils.answer_cache import AnswerCache, get_answer_cache
+from utils.conversation_memory import ConversationMemory
+from utils.metrics import get_metrics
+from utils.ollama_client import AbortHandle, OllamaClient
+from utils.ollama_router import OllamaNode, OllamaRouter, get_router
+from utils.prompt_builder import PromptAssembler, estimate_tokens
+from utils.retriever import BM25Retriever, Retriever
+from utils.scheduler import BACKGROUND, FOREGROUND, LLMScheduler, SchedulerBusy, SharedGeneration, get_scheduler
+from utils.table_query import TableStore
+from utils.vector_index import EmbeddingError, OllamaEmbedder, VectorRetriever
+from utils.warmup import get_foreground_gate
+
+_warmed_models = set()
+_warm_lock = threading.Lock()
 
 class QAEngine:
-    def __init__(self, model_name: str = "gemma:2b", ollama_url: str = "http://localhost:11434"):
+    CONNECTION_ERROR = "❌ Error: Cannot connect to Ollama. Please make sure Ollama is running on your system."
+    BUSY_ERROR = "❌ Error: The model is busy with too many queued questions. Please try again shortly."
+    INTERRUPTED_ERROR = "❌ Error: The answer was interrupted before it finished. Please ask again."
+
+    def __init__(self, model_name: str = "gemma:2b", ollama_url: Optional[str] = None,
+                 max_context_chars: Optional[int] = None, embedding_model: str = "nomic-embed-text",
+                 client: Optional[OllamaClient] = None, answer_cache: Optional[AnswerCache] = None,
+                 keep_alive: str = "30m", num_ctx: int = 2048, scheduler: Optional[LLMScheduler] = None,
+                 router: Optional[OllamaRouter] = None):
         self.model_name = model_name
-        self.ollama_url = ollama_url
+        # Optional character cap on the excerpt; the token budget below always applies
+        self.max_context_chars = max_context_chars
+        self.num_ctx = num_ctx
+        self.prompts = PromptAssembler(num_ctx)
+        self.embedding_model = embedding_model
         self.conversation_history = []
+        # Summary and figures of the whole chat, rendered to the same size every turn
+        self.memory = ConversationMemory(self.prompts.context_budget())
+        self.last_answer = ""
+        # Generations go to the least loaded of the configured Ollama nodes (OLLAMA_URLS);
+        # a client pins the engine to that one server with its pool size and timeouts
+        if router is None:
+            router = OllamaRouter([OllamaNode(client)]) if client else get_router([ollama_url] if ollama_url else None)
+        self.router = router
+        # Embeddings and model warm-up use the first node
+        self.client = client or router.primary.client
+        self.ollama_url = self.client.base_url
+        self.answer_cache = answer_cache or get_answer_cache()
+        self.metrics = get_metrics()
+        # Every session queues for the model through one process-wide scheduler
+        self.scheduler = scheduler or get_scheduler()
+        self.session_id = uuid.uuid4().hex
+        # Background engines (answer warm-up) give way to user questions
+        self.background = False
+        # How long Ollama keeps the model loaded after each request
+        self.keep_alive = keep_alive
 
     def check_ollama_connection(self) -> bool:
-        try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except requests.exceptions.RequestException:
-            return False
+        return self.router.is_connected()
 
     def check_model_availability(self) -> bool:
-        try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json()
-                model_names = [model['name'] for model in models.get('models', [])]
-                return self.model_name in model_names
-            return False
-        except requests.exceptions.RequestException:
-            return False
+        return self.router.has_model(self.model_name)
+
+    def generate_response(self, question: str, document_content: str, context: str = "",
+                          retriever: Optional[Retriever] = None, tables: Optional[TableStore] = None,
+                          document_id: str = "", on_wait: Optional[Callable[[int, float], None]] = None) -> str:
+        computed = self._answer_from_tables(question, tables)
+        if computed:
+            return computed
+
+        request = self._prepare_request(question, document_content, context, retriever, document_id)
+        cached = self._answer_from_cache(question, request)
+        if cached:
+            return cached
 
-    def generate_response(self, question: str, document_content: str, context: str = "") -> str:
-        if not self.check_ollama_connection():
-            return "❌ Error: Cannot connect to Ollama. Please make sure Ollama is running on your system."
+        error = self._check_backend()
+        if error:
+            return error
 
-        if not self.check_model_availability():
-            return f"❌ Error: Model '{self.model_name}' not found. Please make sure you have downloaded the model using: ollama pull {self.model_name}"
+        if self.background:
+            return self._generate(question, request, on_wait)
 
+        # Identical questions already being answered share that generation
+        shared, leader = self.scheduler.join(request['cache_key'])
+        if not leader:
+            for _ in shared.follow():
+                pass
+            return self._shared_outcome(question, shared)
+
+        answer = ""
         try:
-            prompt = self._create_financial_prompt(question, document_content, context)
+            answer = self._generate(question, request, on_wait)
+            return answer
+        finally:
+            self._complete_shared(request['cache_key'], shared, answer)
 
+    def _generate(self, question: str, request: Dict,
+                  on_wait: Optional[Callable[[int, float], None]] = None) -> str:
+        try:
             # Make request to Ollama
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "top_p": 0.9,
-                        "max_tokens": 500
-                    }
-                },
-                timeout=180
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                answer = result.get('response', '').strip()
-                
-                # Post-process the answer
-                answer = self._post_process_answer(answer)
-                
-                # Update conversation history
-                self._update_conversation_history(question, answer)
-                
-                return answer
-            else:
-                return f"❌ Error: Ollama returned status code {response.status_code}"
+            with self._generation_slot(on_wait):
+                response, node = self._post_generation(self._generation_payload(request, stream=False))
+
+            error = self._check_generate_status(response, node)
+            if error:
+                return error
 
+            result = response.json()
+            self.metrics.record_generation(self.model_name, result)
+            self.metrics.increment('answers_total', source='model')
+            answer = result.get('response', '').strip()
+            
+            # Post-process the answer
+            answer = self._post_process_answer(answer)
+            
+            # Update conversation history
+            self._update_conversation_history(question, answer)
+            self.answer_cache.put(request['cache_key'], answer)
+            
+            return answer
+
+        except SchedulerBusy:
+            return self.BUSY_ERROR
         except requests.exceptions.Timeout:
             return "❌ Error: Request timed out. The model might be taking too long to respond."
+        except requests.exceptions.ConnectionError:
+            return self.CONNECTION_ERROR
         except requests.exceptions.RequestException as e:
             return f"❌ Error: Failed to connect to Ollama: {str(e)}"
         except Exception as e:
             return f"❌ Error: An unexpected error occurred: {str(e)}"
 
-    def _create_financial_prompt(self, question: str, document_content: str, context: str) -> str:
-        # Limit document content to prevent token overflow
-        max_content_length = 3000
-        if len(document_content) > max_content_length:
-            document_content = document_content[:max_content_length] + "...[content truncated]"
+    def stream_response(self, question: str, document_content: str, context: str = "",
+                        retriever: Optional[Retriever] = None, tables: Optional[TableStore] = None,
+                        document_id: str = "", on_wait: Optional[Callable[[int, float], None]] = None) -> Iterator[str]:
+        """Yield answer text deltas as Ollama generates them.
+
+        The post-processed answer is available as ``last_answer`` once the
+        generator is exhausted, and conversation history is updated then.
+        While the question waits for the model, ``on_wait`` receives the
+        queue position and the estimated wait in seconds.
+        """
+        self.last_answer = ""
+        computed = self._answer_from_tables(question, tables)
+        if computed:
+            self.last_answer = computed
+            yield computed
+            return
+
+        request = self._prepare_request(question, document_content, context, retriever, document_id)
+        cached = self._answer_from_cache(question, request)
+        if cached:
+            self.last_answer = cached
+            yield cached
+            return
+
+        error = self._check_backend()
+        if error:
+            self.last_answer = error
+            yield error
+            return
+
+        if self.background:
+            yield from self._stream_generation(question, request, on_wait)
+            return
+
+        # Identical questions already being answered share that generation
+        shared, leader = self.scheduler.join(request['cache_key'])
+        if not leader:
+            yield from shared.follow()
+            self.last_answer = self._shared_outcome(question, shared)
+            return
+
+        try:
+            for delta in self._stream_generation(question, request, on_wait):
+                shared.append(delta)
+                yield delta
+        finally:
+            self._complete_shared(request['cache_key'], shared, self.last_answer)
 
-        prompt = f"""You are a professional financial analyst assistant. Analyze the financial document content provided and answer questions accurately and concisely.
+    def _stream_generation(self, question: str, request: Dict,
+                           on_wait: Optional[Callable[[int, float], None]] = None) -> Iterator[str]:
+        parts = []
+        final = {}
+        error = None
+        tried = []
+        abort = None
+        try:
+            with self._generation_slot(on_wait) as abort:
+                while True:
+                    with self.router.route(self.model_name, tried) as node:
+                        try:
+                            # The span ends with the final chunk and leaves out the caller's time between tokens
+                            with self.metrics.span('http') as http, node.client.post(
+                                "/api/generate",
+                                self._generation_payload(request, stream=True),
+                                stream=True,
+                                abort=abort
+                            ) as response:
+                                started = time.perf_counter()
+                                error = self._check_generate_status(response, node)
+                                if not error:
+                                    # Ollama streams one JSON object per line
+                                    for line in response.iter_lines():
+                                        if not line:
+                                            continue
+                                        chunk = json.loads(line)
+                                        if chunk.get('error'):
+                                            error = f"❌ Error: {chunk['error']}"
+                                            break
+                                        delta = chunk.get('response', '')
+                                        if delta:
+                                            if not parts:
+                                                self.metrics.observe_stage('first_token', time.perf_counter() - started)
+                                            parts.append(delta)
+                                            with http.paused():
+                                                yield delta
+                                        if chunk.get('done'):
+                                            # The final object carries Ollama's timings and the context tokens
+                                            final = chunk
+                                            break
+                            break
+                        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                            # Once tokens reached the caller the answer cannot move to another node,
+                            # and one cut off for a user question is not the node's fault
+                            if parts or (abort is not None and abort.aborted) or not self._fail_over(node, tried, e):
+                                raise
 
-FINANCIAL DOCUMENT CONTENT:
-{document_content}
+        except SchedulerBusy:
+            error = self.BUSY_ERROR
+        except requests.exceptions.Timeout:
+            error = "❌ Error: Request timed out. The model might be taking too long to respond."
+        except requests.exceptions.ConnectionError:
+            error = self.INTERRUPTED_ERROR if abort is not None and abort.aborted else self.CONNECTION_ERROR
+        except requests.exceptions.RequestException as e:
+            error = f"❌ Error: Failed to connect to Ollama: {str(e)}"
+        except Exception as e:
+            error = f"❌ Error: An unexpected error occurred: {str(e)}"
 
-CONVERSATION CONTEXT:
-{context}
+        if error:
+            self.last_answer = error
+            yield ("\n\n" if parts else "") + error
+            return
 
-USER QUESTION: {question}
+        self.metrics.record_generation(self.model_name, final)
+        self.metrics.increment('answers_total', source='model')
+        answer = self._post_process_answer(''.join(parts).strip())
+        self._update_conversation_history(question, answer)
+        self.answer_cache.put(request['cache_key'], answer)
+        self.last_answer = answer
 
-INSTRUCTIONS:
-1. Answer based ONLY on the information in the provided document
-2. If the information is not in the document, clearly state that
-3. Provide specific numbers and figures when available
-4. Use professional financial terminology
-5. Be concise but comprehensive
-6. Format numbers properly (use commas for thousands, proper currency symbols)
-7. If asked about trends, compare different periods if data is available
+    def _answer_from_tables(self, question: str, tables: Optional[TableStore]) -> Optional[str]:
+        """Answer aggregation questions over spreadsheet or PDF statement tables without calling the model"""
+        if not tables:
+            return None
 
-ANSWER:"""
+        try:
+            answer = tables.answer(question)
+        except Exception:
+            # Unexpected table shapes fall back to the model
+            return None
 
-        return prompt
+        if answer:
+            self.metrics.increment('answers_total', source='tables')
+            self._update_conversation_history(question, answer)
+        return answer
+
+    def _answer_from_cache(self, question: str, request: Dict) -> Optional[str]:
+        # Sample answers are pre-generated without a conversation, so they are also looked up by question alone
+        answer = self.answer_cache.get(request['cache_key'], request['sample_key'])
+        if answer:
+            self.metrics.increment('answers_total', source='cache')
+            self._update_conversation_history(question, answer)
+        return answer
+
+    def _shared_outcome(self, question: str, shared: SharedGeneration) -> str:
+        if shared.error:
+            return shared.error
+        self._update_conversation_history(question, shared.answer)
+        return shared.answer
+
+    def _complete_shared(self, key: str, shared: SharedGeneration, outcome: str):
+        # A generation abandoned midway (closed stream) still releases its followers
+        if not outcome:
+            outcome = self.INTERRUPTED_ERROR
+            shared.append(("\n\n" if shared.parts else "") + outcome)
+        if outcome.startswith("❌"):
+            self.scheduler.complete(key, shared, error=outcome)
+        else:
+            self.scheduler.complete(key, shared, answer=outcome)
+
+    @contextmanager
+    def _generation_slot(self, on_wait: Optional[Callable[[int, float], None]] = None):
+        """Hold a scheduler slot; background generations get an AbortHandle a user question triggers"""
+        started = time.perf_counter()
+        if self.background:
+            abort = AbortHandle()
+            with self.scheduler.slot(self.session_id, BACKGROUND), get_foreground_gate().background(abort.abort):
+                yield abort
+            return
+        # Announce the question before queueing so warm-up generations make way
+        with get_foreground_gate().foreground(), self.scheduler.slot(self.session_id, FOREGROUND, on_wait):
+            self.metrics.observe_stage('queue_wait', time.perf_counter() - started)
+            yield None
+
+    def _post_generation(self, payload: Dict) -> Tuple[requests.Response, OllamaNode]:
+        """Send a non-streaming generation, moving to another node if one is unreachable or times out"""
+        tried = []
+        while True:
+            with self.router.route(self.model_name, tried) as node:
+                try:
+                    with self.metrics.span('http'):
+                        return node.client.post("/api/generate", payload), node
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if not self._fail_over(node, tried, e):
+                        raise
+
+    def _fail_over(self, node: OllamaNode, tried: List[OllamaNode], error: Exception) -> bool:
+        """Record a failed node and say whether another one is left to try"""
+        if isinstance(error, requests.exceptions.ConnectionError):
+            # A read timeout only means the node is busy; the monitor marks a refused
+            # connection down and re-probes after other connection errors
+            node.health.record_failure(error)
+        tried.append(node)
+        if not self.router.candidates(self.model_name, tried):
+            return False
+        self.metrics.increment('failovers_total', node=node.url)
+        return True
+
+    def _check_backend(self) -> Optional[str]:
+        # Only consult the cached health snapshots; an unknown state goes straight
+        # to generation and failures are detected from that call instead
+        with self.metrics.span('health_check'):
+            snapshot = self.router.status(block=False)
+        if snapshot is None:
+            return None
+
+        if not snapshot['connected']:
+            return self.CONNECTION_ERROR
+
+        if self.model_name not in snapshot['models']:
+            return self._model_missing_error()
+
+        return None
+
+    def _check_generate_status(self, response, node: OllamaNode) -> Optional[str]:
+        if response.status_code == 200:
+            node.health.record_success(self.model_name)
+            return None
+
+        if response.status_code == 404:
+            node.health.record_model_missing(self.model_name)
+            return self._model_missing_error()
+
+        return f"❌ Error: Ollama returned status code {response.status_code}"
+
+    def _model_missing_error(self) -> str:
+        return f"❌ Error: Model '{self.model_name}' not found. Please make sure you have downloaded the model using: ollama pull {self.model_name}"
+
+    def _prepare_request(self, question: str, document_content: str, context: str,
+                         retriever: Optional[Retriever], document_id: str = "") -> Dict:
+        """Build the prompt and the answer-cache key"""
+        # Send only the chunks relevant to this question when an index is available,
+        # filling the tokens the prompt has left for the document
+        if retriever is not None:
+            try:
+                with self.metrics.span('retrieval'):
+                    document_content = retriever.build_context(
+                        question, self.prompts.document_budget(question, context), measure=estimate_tokens
+                    )
+            except EmbeddingError:
+                pass
+        if self.max_context_chars is not None:
+            document_content = document_content[:self.max_context_chars]
+        with self.metrics.span('prompt_build'):
+            request = self.prompts.assemble(question, document_content, context)
+
+        # Keyed on the excerpt the model sees, so rephrasings that retrieve the same pages hit
+        request['cache_key'] = AnswerCache.make_key(
+            document_id, self.model_name, question, f"{request['excerpt']}\x00{context}"
+        )
+        request['sample_key'] = AnswerCache.sample_key(document_id, self.model_name, question)
+        return request
+
+    def _generation_payload(self, request: Dict, stream: bool) -> Dict:
+        payload = {
+            "model": self.model_name,
+            "prompt": request['prompt'],
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.3,
+                "top_p": 0.9,
+                "num_ctx": self.num_ctx,
+                # Bounding the answer length is the main lever on CPU latency
+                "num_predict": request['num_predict']
+            }
+        }
+        return payload
+
+    def warm_model(self):
+        """Load the model into memory on every node in the background so the first question skips the cold start"""
+        for node in self.router.nodes:
+            key = (node.url, self.model_name)
+            with _warm_lock:
+                if key in _warmed_models:
+                    continue
+                _warmed_models.add(key)
+            threading.Thread(target=self._load_model, args=(node, key), daemon=True).start()
+
+    def _load_model(self, node: OllamaNode, key: Tuple[str, str]):
+        try:
+            # A generate request without a prompt just loads the model
+            node.client.post(
+                "/api/generate",
+                {"model": self.model_name, "keep_alive": self.keep_alive},
+                read_timeout=300
+            ).close()
+        except requests.exceptions.RequestException:
+            with _warm_lock:
+                _warmed_models.discard(key)
+
+    def build_retriever(self, document_content: str, mode: str = "keyword") -> Retriever:
+        """Index a processed document for keyword (BM25) or semantic (embedding) retrieval"""
+        if mode == "semantic":
+            embedder = OllamaEmbedder(self.embedding_model, self.ollama_url, client=self.client)
+            return VectorRetriever.from_document(document_content, embedder)
+        return BM25Retriever.from_document(document_content)
 
     def _post_process_answer(self, answer: str) -> str:
         """Post-process the generated answer"""
@@ -135,20 +463,13 @@ ANSWER:"""
             'answer': answer
         })
         
-        # Keep only last 3 exchanges to manage context size
+        # Keep only last 3 exchanges, older ones live on in the memory's summary
         if len(self.conversation_history) > 3:
             self.conversation_history.pop(0)
+        self.memory.add_exchange(question, answer)
 
     def get_conversation_context(self) -> str:
-        if not self.conversation_history:
-            return ""
-        
-        context = "Previous conversation:\n"
-        for i, exchange in enumerate(self.conversation_history[-2:], 1):  # Last 2 exchanges
-            context += f"Q{i}: {exchange['question']}\n"
-            context += f"A{i}: {exchange['answer'][:200]}...\n\n"
-        
-        return context
+        return self.memory.context()
 
     def generate_sample_questions(self, document_content: str) -> List[str]:
         sample_questions = [
@@ -161,13 +482,14 @@ ANSWER:"""
         
         # Try to generate more specific questions based on content
         specific_questions = []
-        if 'revenue' in document_content.lower():
+        lowered = document_content.lower()
+        if 'revenue' in lowered:
             specific_questions.append("What is the breakdown of revenue by category?")
-        if 'expense' in document_content.lower():
+        if 'expense' in lowered:
             specific_questions.append("What are the largest expense items?")
         if any(year in document_content for year in ['2023', '2024', '2022']):
             specific_questions.append("Compare financial performance across different years")
-        if 'cash flow' in document_content.lower():
+        if 'cash flow' in lowered:
             specific_questions.append("What is the cash flow situation?")
         
         # Combine and return unique questions
@@ -176,9 +498,11 @@ ANSWER:"""
 
     def clear_history(self):
         self.conversation_history = []
+        self.memory.clear()
 
     def get_system_status(self) -> Dict[str, bool]:
+        snapshot = self.router.status()
         return {
-            'ollama_connected': self.check_ollama_connection(),
-            'model_available': self.check_model_availability()
+            'ollama_connected': snapshot['connected'],
+            'model_available': snapshot['connected'] and self.model_name in snapshot['models']
         }
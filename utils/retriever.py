@@ -0,0 +1,195 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# Section markers emitted by DocumentProcessor for PDFs and Excel workbooks
+SECTION_PATTERN = re.compile(r'^--- (Page \d+|Sheet: .*?) ---$', re.MULTILINE)
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[.,]\d+)*')
+
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+    'how', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'were', 'what', 'when', 'which', 'with', 'all', 'any', 'can', 'did',
+    'does', 'do', 'me', 'show', 'tell', 'give', 'there', 'their', 'our', 'we'
+])
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def bm25_idf(chunk_count: int, df: int) -> float:
+    return math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+
+
+def chunk_document(document_content: str, max_chunk_chars: int = 1200) -> List[Dict[str, Any]]:
+    """Split processed document text into chunks along page/sheet boundaries"""
+    chunks = []
+    markers = list(SECTION_PATTERN.finditer(document_content))
+
+    sections = []
+    if not markers:
+        sections.append(('Document', document_content))
+    else:
+        preamble = document_content[:markers[0].start()]
+        if preamble.strip():
+            sections.append(('Document', preamble))
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(document_content)
+            sections.append((marker.group(1), document_content[marker.end():end]))
+
+    for source, text in sections:
+        for piece in _split_section(text.strip(), max_chunk_chars):
+            chunks.append({'id': len(chunks), 'source': source, 'text': piece})
+
+    return chunks
+
+
+def _split_section(text: str, max_chunk_chars: int) -> List[str]:
+    if not text:
+        return []
+    if len(text) <= max_chunk_chars:
+        return [text]
+
+    # Break long pages/sheets on line boundaries so table rows stay intact
+    pieces = []
+    current = []
+    current_length = 0
+    for line in text.split('\n'):
+        while len(line) > max_chunk_chars:
+            if current:
+                pieces.append('\n'.join(current))
+                current, current_length = [], 0
+            pieces.append(line[:max_chunk_chars])
+            line = line[max_chunk_chars:]
+        if current and current_length + len(line) + 1 > max_chunk_chars:
+            pieces.append('\n'.join(current))
+            current, current_length = [], 0
+        current.append(line)
+        current_length += len(line) + 1
+    if current:
+        pieces.append('\n'.join(current))
+
+    return [piece for piece in pieces if piece.strip()]
+
+
+class Retriever:
+    """Base class for chunk indexes that can supply question-specific context"""
+
+    chunks: List[Dict[str, Any]]
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def build_context(self, query: str, max_chars: int = 3000, top_k: int = 8,
+                      measure: Callable[[str], int] = len) -> str:
+        """Assemble the most relevant chunks for a question within a budget.
+
+        The budget is in characters unless ``measure`` counts something else,
+        such as estimated tokens.
+        """
+        results = self.search(query, top_k)
+        if not results:
+            # Nothing matched the question, fall back to the start of the document
+            results = self.chunks[:top_k]
+
+        selected = []
+        used = 0
+        for chunk in results:
+            header = f"--- {chunk['source']} ---\n"
+            text_cost = measure(chunk['text'])
+            cost = measure(header) + text_cost + 1
+            if used + cost > max_chars:
+                remaining = max_chars - used - measure(header)
+                if not selected and remaining > 0:
+                    # Cut the best chunk in proportion when even it does not fit
+                    keep = len(chunk['text']) * remaining // max(1, text_cost)
+                    selected.append((chunk['id'], header + chunk['text'][:keep]))
+                continue
+            selected.append((chunk['id'], header + chunk['text']))
+            used += cost
+
+        # Present the chosen chunks in document order
+        selected.sort(key=lambda item: item[0])
+        return '\n'.join(text for _, text in selected)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+
+class BM25Retriever(Retriever):
+    """In-memory inverted index that ranks document chunks with Okapi BM25"""
+
+    def __init__(self, chunks: Optional[List[Dict[str, Any]]] = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self.postings = {}
+        self.chunk_lengths = []
+        self.total_length = 0
+        self._norms = None
+        if chunks:
+            self.add_chunks(chunks)
+
+    @classmethod
+    def from_document(cls, document_content: str, max_chunk_chars: int = 1200) -> 'BM25Retriever':
+        return cls(chunk_document(document_content, max_chunk_chars))
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]):
+        for chunk in chunks:
+            chunk_id = len(self.chunks)
+            chunk = dict(chunk, id=chunk_id)
+            self.chunks.append(chunk)
+
+            term_counts = Counter(tokenize(chunk['text']))
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, []).append((chunk_id, count))
+
+            length = sum(term_counts.values())
+            self.chunk_lengths.append(length)
+            self.total_length += length
+
+        # Length normalisation depends on the average chunk length
+        self._norms = None
+
+    def _length_norms(self) -> List[float]:
+        if self._norms is None:
+            avg_length = (self.total_length / len(self.chunk_lengths)) or 1.0
+            self._norms = [
+                self.k1 * (1 - self.b + self.b * length / avg_length)
+                for length in self.chunk_lengths
+            ]
+        return self._norms
+
+    def length_norms(self, avg_length: float) -> List[float]:
+        """Length normalisation against an outside average chunk length (e.g. a whole corpus)"""
+        return [self.k1 * (1 - self.b + self.b * length / (avg_length or 1.0)) for length in self.chunk_lengths]
+
+    def document_frequency(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def score(self, idfs: Dict[str, float], norms: List[float]) -> Dict[int, float]:
+        """BM25 scores of matching chunks for query terms with precomputed IDF weights"""
+        k1_plus_one = self.k1 + 1
+        scores = {}
+        for term, idf in idfs.items():
+            for chunk_id, tf in self.postings.get(term, ()):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * k1_plus_one / (tf + norms[chunk_id])
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if not self.chunks:
+            return []
+
+        chunk_count = len(self.chunks)
+        idfs = {}
+        for term in set(tokenize(query)):
+            df = self.document_frequency(term)
+            if df:
+                idfs[term] = bm25_idf(chunk_count, df)
+
+        scores = self.score(idfs, self._length_norms())
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [dict(self.chunks[chunk_id], score=score) for chunk_id, score in best]
@@ -0,0 +1,231 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.ollama_router import configured_urls
+
+FOREGROUND = 0
+BACKGROUND = 1
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class Ticket:
+    """One request waiting for, or holding, a generation slot"""
+
+    def __init__(self, session_id: str, priority: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+
+class SharedGeneration:
+    """Output of one generation, readable by every request coalesced onto it"""
+
+    def __init__(self):
+        self.parts = []
+        self.answer = None
+        self.error = None
+        self.done = False
+        self._condition = threading.Condition()
+
+    def append(self, delta: str):
+        with self._condition:
+            self.parts.append(delta)
+            self._condition.notify_all()
+
+    def finish(self, answer: Optional[str] = None, error: Optional[str] = None):
+        with self._condition:
+            self.answer = answer
+            self.error = error
+            self.done = True
+            self._condition.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        """Yield every delta from the start, blocking until the generation finishes"""
+        position = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.done or len(self.parts) > position)
+                new_parts = self.parts[position:]
+                done = self.done
+            position += len(new_parts)
+            yield from new_parts
+            if done:
+                return
+
+
+class LLMScheduler:
+    """Process-wide gate in front of the model shared by every session.
+
+    At most ``max_concurrent`` generations run at once. Waiting requests are
+    queued per session and the least recently served session goes next,
+    foreground before background,
+    so one session asking many questions cannot starve the others. Beyond
+    ``max_waiting`` queued requests new ones are refused with SchedulerBusy.
+    Foreground requests for the same key (document, model, question and
+    context) share a single in-flight generation.
+    """
+
+    def __init__(self, max_concurrent: int = 1, max_waiting: int = 64, initial_service_time: float = 20.0):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        # Moving average of how long a generation holds its slot, for wait estimates
+        self.service_time = initial_service_time
+        self._active = 0
+        self._waiting = 0
+        self._queues = {FOREGROUND: OrderedDict(), BACKGROUND: OrderedDict()}
+        self._inflight = {}
+        # Turn at which each session was last served, so the least recently served goes next
+        self._turn = 0
+        self._last_served = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, session_id: str, priority: int = FOREGROUND,
+             on_wait: Optional[Callable[[int, float], None]] = None, poll_interval: float = 0.5):
+        """Hold a generation slot for the duration of the block.
+
+        While queued, ``on_wait`` is called with the queue position and the
+        estimated wait in seconds every ``poll_interval``.
+        """
+        ticket = self._enqueue(session_id, priority)
+        started = None
+        try:
+            while not ticket.granted.wait(poll_interval):
+                if on_wait is not None:
+                    position, eta = self.estimate(ticket)
+                    if position:
+                        on_wait(position, eta)
+            started = time.monotonic()
+            yield ticket
+        finally:
+            self._finish(ticket, started)
+
+    def _enqueue(self, session_id: str, priority: int) -> Ticket:
+        ticket = Ticket(session_id, priority)
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                raise SchedulerBusy(f"{self._waiting} requests already waiting for the model")
+            self._queues[priority].setdefault(session_id, deque()).append(ticket)
+            self._waiting += 1
+            if len(self._last_served) > 4096:
+                # Forget sessions with nothing queued, they rejoin as never served
+                queued = set(self._queues[FOREGROUND]) | set(self._queues[BACKGROUND])
+                self._last_served = {s: turn for s, turn in self._last_served.items() if s in queued}
+            self._dispatch()
+        return ticket
+
+    def _finish(self, ticket: Ticket, started: Optional[float]):
+        with self._lock:
+            if started is None:
+                # Abandoned while queued (closed stream, rerun), just leave the queue;
+                # a grant that raced with the abandonment still releases its slot
+                queue = self._queues[ticket.priority].get(ticket.session_id)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    self._waiting -= 1
+                    if not queue:
+                        del self._queues[ticket.priority][ticket.session_id]
+                if not ticket.granted.is_set():
+                    return
+            else:
+                elapsed = time.monotonic() - started
+                self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+            self._active -= 1
+            self._dispatch()
+
+    def _next_session(self, sessions: Dict[str, deque], last_served: Dict[str, int]) -> str:
+        # Least recently served session first; ties keep arrival order
+        return min(sessions, key=lambda session_id: last_served.get(session_id, -1))
+
+    def _dispatch(self):
+        # Caller holds the lock
+        while self._active < self.max_concurrent:
+            for priority in (FOREGROUND, BACKGROUND):
+                sessions = self._queues[priority]
+                if sessions:
+                    session_id = self._next_session(sessions, self._last_served)
+                    ticket = sessions[session_id].popleft()
+                    if not sessions[session_id]:
+                        del sessions[session_id]
+                    break
+            else:
+                return
+            self._turn += 1
+            self._last_served[session_id] = self._turn
+            self._waiting -= 1
+            self._active += 1
+            ticket.granted.set()
+
+    def _service_order(self) -> List[Ticket]:
+        # Replay the dispatch rule over a copy of the queues
+        order = []
+        last_served = dict(self._last_served)
+        turn = self._turn
+        for priority in (FOREGROUND, BACKGROUND):
+            sessions = OrderedDict((session_id, deque(queue)) for session_id, queue in self._queues[priority].items())
+            while sessions:
+                session_id = self._next_session(sessions, last_served)
+                order.append(sessions[session_id].popleft())
+                if not sessions[session_id]:
+                    del sessions[session_id]
+                turn += 1
+                last_served[session_id] = turn
+        return order
+
+    def estimate(self, ticket: Ticket) -> Tuple[int, float]:
+        """Queue position (1 = next) and estimated seconds until the ticket runs; 0 once running"""
+        with self._lock:
+            if ticket.granted.is_set():
+                return 0, 0.0
+            order = self._service_order()
+            if ticket not in order:
+                return 0, 0.0
+            position = order.index(ticket) + 1
+            rounds = math.ceil(position / self.max_concurrent)
+            return position, rounds * self.service_time
+
+    def join(self, key: str) -> Tuple[SharedGeneration, bool]:
+        """The in-flight generation for key and whether the caller must produce it"""
+        with self._lock:
+            shared = self._inflight.get(key)
+            if shared is not None:
+                return shared, False
+            shared = self._inflight[key] = SharedGeneration()
+            return shared, True
+
+    def complete(self, key: str, shared: SharedGeneration, answer: Optional[str] = None,
+                 error: Optional[str] = None):
+        with self._lock:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+        shared.finish(answer, error)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'active': self._active,
+                'waiting': self._waiting,
+                'coalesced': len(self._inflight),
+                'service_time': self.service_time,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler shared by every session's QAEngine, one generation per Ollama node"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(max_concurrent=len(configured_urls()))
+        return _scheduler
@@ -0,0 +1,133 @@
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import BinaryIO, List, Optional
+
+from utils.storage import get_cache_dir
+
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Spool files this old were left by a process that crashed or was killed
+SPOOL_MAX_AGE_SECONDS = 24 * 3600
+
+_pruned = False
+_prune_lock = threading.Lock()
+
+
+def _release(view: memoryview, mapping: Optional[mmap.mmap], path: Optional[str]):
+    try:
+        if mapping is not None:
+            view.release()
+            mapping.close()
+    except BufferError:
+        # A caller still holds a view, the mapping goes with its last reference
+        pass
+    finally:
+        if path is not None:
+            try:
+                # POSIX keeps the mapped pages readable after the unlink
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SpooledUpload:
+    """A document on local disk read through a memory map.
+
+    ``view`` is a read-only memoryview over the mapped file, so hashing reads
+    the page cache instead of copying the bytes, and parsers open ``path``
+    themselves. Offers the ``name``/``size`` attributes of Streamlit's
+    UploadedFile, so it can be passed wherever an upload is expected. With
+    ``delete=True`` the file is temporary and removed on ``close()`` or
+    garbage collection.
+    """
+
+    def __init__(self, path: str, name: Optional[str] = None, delete: bool = False):
+        self.path = path
+        self.temporary = delete
+        self.name = name or os.path.basename(path)
+        self.size = os.path.getsize(path)
+
+        mapping = None
+        if self.size:
+            with open(path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(mapping)
+        else:
+            # mmap refuses empty files
+            self.view = memoryview(b'')
+        self._finalizer = weakref.finalize(self, _release, self.view, mapping, path if delete else None)
+
+    def open(self) -> BinaryIO:
+        """An independent file handle, for readers that seek"""
+        return open(self.path, 'rb')
+
+    def getbuffer(self) -> memoryview:
+        return self.view
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self) -> 'SpooledUpload':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        raise TypeError("SpooledUpload is bound to this process, pass its path instead")
+
+
+def prune_spools(spool_dir: Optional[str] = None, max_age: float = SPOOL_MAX_AGE_SECONDS) -> List[str]:
+    """Delete spool files older than ``max_age`` seconds; returns their paths"""
+    spool_dir = spool_dir or get_cache_dir('uploads')
+    removed = []
+    now = time.time()
+    for name in os.listdir(spool_dir):
+        path = os.path.join(spool_dir, name)
+        try:
+            if name.startswith('upload-') and now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed.append(path)
+        except OSError:
+            pass
+    return removed
+
+
+def spool_upload(uploaded_file, spool_dir: Optional[str] = None) -> SpooledUpload:
+    """Write an upload to a temporary file once and map it.
+
+    Uploads that are already on disk are returned as they are. The first
+    spool in a process clears out files orphaned by earlier processes.
+    """
+    global _pruned
+    if isinstance(uploaded_file, SpooledUpload):
+        return uploaded_file
+
+    if spool_dir is None and not _pruned:
+        with _prune_lock:
+            if not _pruned:
+                _pruned = True
+                prune_spools()
+
+    name = uploaded_file.name
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix=os.path.splitext(name)[1],
+                                dir=spool_dir or get_cache_dir('uploads'))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if hasattr(uploaded_file, 'getbuffer'):
+                # Streamlit's UploadedFile is a BytesIO, write straight from its buffer
+                with uploaded_file.getbuffer() as buffer:
+                    f.write(buffer)
+            else:
+                uploaded_file.seek(0)
+                shutil.copyfileobj(uploaded_file, f, COPY_CHUNK_BYTES)
+                uploaded_file.seek(0)
+        return SpooledUpload(path, name, delete=True)
+    except BaseException:
+        os.remove(path)
+        raise
@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+# Root for all on-disk caches, override with FINANCIAL_QA_CACHE_DIR
+DEFAULT_CACHE_ROOT = os.environ.get(
+    'FINANCIAL_QA_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'financial_qa')
+)
+
+
+def get_cache_dir(name: str, root: str = None) -> str:
+    path = os.path.join(root or DEFAULT_CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(part)
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
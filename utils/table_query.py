@@ -0,0 +1,312 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+YEAR_PATTERN = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+
+# Aggregation keywords, checked in order so "latest total revenue" reads as a lookup
+AGGREGATIONS = [
+    ('growth', ('growth', 'grow', 'grew', 'change', 'changed', 'increase', 'decrease', 'increased', 'decreased')),
+    ('latest', ('latest', 'last', 'recent', 'current')),
+    ('previous', ('previous', 'prior')),
+    ('mean', ('average', 'avg', 'mean')),
+    ('max', ('maximum', 'max', 'highest', 'largest', 'peak', 'biggest')),
+    ('min', ('minimum', 'min', 'lowest', 'smallest')),
+    ('count', ('count', 'many')),
+    ('sum', ('total', 'sum', 'overall', 'combined', 'cumulative')),
+]
+
+AGGREGATION_LABELS = {
+    'sum': 'Total', 'mean': 'Average', 'max': 'Maximum', 'min': 'Minimum', 'count': 'Count',
+    'growth': 'Growth', 'latest': 'Latest', 'previous': 'Previous',
+}
+
+PERIOD_WORDS = ('year', 'quarter', 'month', 'period', 'date', 'fy', 'qtr')
+
+# Aggregations that need the periods in order
+TIME_AGGREGATIONS = ('latest', 'previous', 'growth')
+
+# Statement rows hold one value per period, they are only aggregated across periods on request
+ACROSS_PERIOD_WORDS = frozenset(['years', 'periods', 'quarters', 'months'])
+
+# Asking for several line items ("what are the largest expense items?") is not one number
+LIST_WORDS = frozenset(['are', 'item', 'items', 'categories', 'category', 'components', 'drivers',
+                        'sources', 'breakdown', 'top', 'which'])
+
+# Words that describe the question rather than a column or line item
+QUESTION_WORDS = frozenset([
+    'what', 'is', 'the', 'was', 'were', 'are', 'of', 'for', 'in', 'by', 'a', 'an', 'and', 'to',
+    'how', 'much', 'did', 'does', 'has', 'have', 'show', 'me', 'give', 'tell', 'across', 'all',
+    'each', 'per', 'from', 'over', 'sheet', 'value', 'amount', 'figure', 'number', 'period',
+])
+
+
+# (match score, answer line, newest period year of the statement answered from, the fact stated
+# without its source, so the same figure repeated in several tables is given once)
+TableAnswer = Tuple[float, str, Optional[str], str]
+
+
+def _stem(word: str) -> str:
+    # Light stemming so "expenses" matches an "Expense" column
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us')):
+        return word[:-1]
+    return word
+
+
+def _words(text: Any) -> List[str]:
+    return [_stem(word) for word in WORD_PATTERN.findall(str(text).lower())]
+
+
+def _format_value(value: float) -> str:
+    if pd.isna(value):
+        return "n/a"
+    if float(value).is_integer():
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+def _label(aggregation: str, subject: Any) -> str:
+    if aggregation == 'growth':
+        return f"{subject} growth"
+    return f"{AGGREGATION_LABELS[aggregation]} {subject}"
+
+
+class TableStore:
+    """Parsed spreadsheet or PDF tables that answer aggregation questions with pandas.
+
+    Two layouts are recognised: long tables with one numeric column per metric
+    (optionally with a year/quarter column), and statement-style tables with
+    line items in the first text column and periods as numeric columns.
+    ``source_label`` names a table in answers ("sheet" or "table"). Sheets a
+    lazy workbook only loaded in part (its ``truncated_sheets``) are never
+    answered from, since their totals would be wrong.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], financial_keywords: Optional[List[str]] = None,
+                 source_label: str = "sheet"):
+        self.tables = tables
+        self.financial_keywords = set(financial_keywords or [])
+        self.source_label = source_label
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def answer(self, question: str) -> Optional[str]:
+        """Return a computed answer, or None when the question has no deterministic plan"""
+        raw_words = WORD_PATTERN.findall(question.lower())
+        year = None
+        year_match = YEAR_PATTERN.search(question)
+        if year_match:
+            year = year_match.group(1)
+
+        aggregation = self._match_aggregation(raw_words)
+        if aggregation is None:
+            if year is None:
+                return None
+            # "What was revenue in 2023?" is a lookup of that period's total
+            aggregation = 'sum'
+        if aggregation in ('max', 'min') and LIST_WORDS.intersection(raw_words):
+            return None
+
+        across_periods = bool(ACROSS_PERIOD_WORDS.intersection(raw_words))
+        subject_words = [_stem(word) for word in raw_words if word not in QUESTION_WORDS
+                         and word not in PERIOD_WORDS and word not in ACROSS_PERIOD_WORDS
+                         and not any(word in keywords for _, keywords in AGGREGATIONS)
+                         and word != year]
+        if not subject_words:
+            return None
+
+        question_words = _words(question)
+        tables = self._match_sheets(question_words)
+        truncated = getattr(self.tables, 'truncated_sheets', {})
+        results = []
+        for sheet_name, df in tables:
+            if sheet_name in truncated:
+                continue
+            result = self._answer_long(sheet_name, df, subject_words, aggregation, year, question_words)
+            if result is None:
+                result = self._answer_statement(sheet_name, df, subject_words, aggregation, year, across_periods)
+            if result is not None:
+                results.append(result)
+
+        if not results:
+            return None
+
+        # Keep only the best-matching column/line item when several sheets answer
+        best_score = max(result[0] for result in results)
+        best = [result for result in results if result[0] == best_score]
+        # A filing repeats statements for older periods, period answers come from the newest one
+        periods = [result[2] for result in best if result[2]]
+        if periods:
+            best = [result for result in best if result[2] == max(periods)]
+        lines = []
+        seen = set()
+        for _, line, _, fact in best:
+            if fact not in seen:
+                seen.add(fact)
+                lines.append(line)
+        return "\n".join(lines)
+
+    def _match_aggregation(self, question_words: List[str]) -> Optional[str]:
+        for name, keywords in AGGREGATIONS:
+            if any(word in keywords for word in question_words):
+                return name
+        return None
+
+    def _match_sheets(self, question_words: List[str]) -> List[Tuple[str, pd.DataFrame]]:
+        words = set(question_words)
+        named = []
+        for name in self.tables:
+            sheet_words = set(_words(name))
+            # A sheet called "IS" must not match every "what is ..." question
+            if sheet_words - QUESTION_WORDS and sheet_words <= words:
+                named.append((name, self.tables[name]))
+        return named or [(name, self.tables[name]) for name in self.tables]
+
+    def _score_label(self, label: Any, subject_words: List[str]) -> float:
+        label_words = set(_words(label))
+        if not label_words:
+            return 0.0
+        overlap = len(label_words & set(subject_words))
+        if overlap == 0:
+            return 0.0
+        # Prefer labels fully covered by the question, then financial vocabulary
+        score = overlap - 0.1 * len(label_words - set(subject_words))
+        if any(keyword in str(label).lower() for keyword in self.financial_keywords):
+            score += 0.05
+        return score
+
+    def _period_column(self, df: pd.DataFrame) -> Optional[Any]:
+        for col in df.columns:
+            if any(word in PERIOD_WORDS for word in _words(col)):
+                return col
+        return None
+
+    def _answer_long(self, sheet_name: str, df: pd.DataFrame, subject_words: List[str],
+                     aggregation: str, year: Optional[str], question_words: List[str]) -> Optional[TableAnswer]:
+        period_col = self._period_column(df)
+        if period_col is None and aggregation in TIME_AGGREGATIONS:
+            # Row order says nothing about time without a period column
+            return None
+        numeric_cols = [col for col in df.select_dtypes(include=['number']).columns if col != period_col]
+        if year is not None and period_col is None:
+            # Wide sheets carry the period in the column label ("Revenue 2023")
+            numeric_cols = [col for col in numeric_cols if year in str(col)]
+        scored = [(self._score_label(col, subject_words), col) for col in numeric_cols]
+        scored = [(score, col) for score, col in scored if score > 0]
+        if not scored:
+            return None
+        score, column = max(scored, key=lambda item: item[0])
+
+        data = df
+        if period_col is not None and period_col != column:
+            if year is not None:
+                data = df[df[period_col].astype(str).str.contains(year, regex=False)]
+                if data.empty:
+                    return None
+            if 'by' in question_words and aggregation in ('sum', 'mean', 'max', 'min', 'count'):
+                grouped = data.groupby(period_col, sort=True)[column].agg(aggregation)
+                rows = ", ".join(f"{period}: {_format_value(value)}" for period, value in grouped.items())
+                label = f"{_label(aggregation, column)} by {period_col}"
+                line = f"**{label}** ({self.source_label} *{sheet_name}*): {rows}"
+                return score, line, None, line
+
+        series = data[column].dropna()
+        if series.empty:
+            return None
+
+        if aggregation in ('latest', 'previous', 'growth') and period_col is not None:
+            # Compare period totals, several rows (regions, segments) can share a period
+            series = data.groupby(period_col, sort=True)[column].sum(min_count=1).dropna()
+            if series.empty:
+                return None
+
+        value = self._aggregate(series, aggregation)
+        if value is None:
+            return None
+
+        label = _label(aggregation, column)
+        if aggregation in ('latest', 'previous') and period_col is not None:
+            position = -1 if aggregation == 'latest' else -2
+            label += f" ({period_col} {series.index[position]})"
+        elif year is not None and period_col is not None:
+            label += f" in {year}"
+        line = f"**{label}** ({self.source_label} *{sheet_name}*): {value}"
+        return score, line, None, line
+
+    def _answer_statement(self, sheet_name: str, df: pd.DataFrame, subject_words: List[str],
+                          aggregation: str, year: Optional[str], across_periods: bool) -> Optional[TableAnswer]:
+        text_cols = [col for col in df.columns
+                     if df[col].dtype == object or pd.api.types.is_string_dtype(df[col])]
+        numeric_cols = list(df.select_dtypes(include=['number']).columns)
+        if not text_cols or not numeric_cols:
+            return None
+
+        labels = df[text_cols[0]]
+        scored = [(self._score_label(label, subject_words), i) for i, label in enumerate(labels)]
+        scored = [(score, i) for score, i in scored if score > 0]
+        if not scored:
+            return None
+        score, row_position = max(scored, key=lambda item: item[0])
+        row = df.iloc[row_position]
+        line_item = str(labels.iloc[row_position]).strip()
+
+        if year is not None:
+            year_cols = [col for col in numeric_cols if year in str(col)]
+            if not year_cols:
+                return None
+            value = _format_value(row[year_cols[0]])
+            return (score, f"**{line_item}** ({year_cols[0]}, {self.source_label} *{sheet_name}*): {value}",
+                    None, f"{line_item.lower()}|{year}|{value}")
+
+        series = pd.to_numeric(row[numeric_cols], errors='coerce').dropna()
+        if series.empty:
+            return None
+
+        # Statements often list the newest year first, order period columns chronologically
+        column_years = [YEAR_PATTERN.search(str(col)) for col in series.index]
+        dated = all(column_years)
+        if dated:
+            order = sorted(range(len(series)), key=lambda i: column_years[i].group(1))
+            series = series.iloc[order]
+            column_years = [column_years[i] for i in order]
+
+        if not across_periods:
+            # "Total revenue" names the line item, adding its fiscal years together would be wrong
+            if aggregation == 'sum':
+                aggregation = 'latest'
+            elif aggregation not in TIME_AGGREGATIONS:
+                return None
+        if aggregation in TIME_AGGREGATIONS and not dated:
+            return None
+
+        value = self._aggregate(series, aggregation)
+        if value is None:
+            return None
+
+        newest = column_years[-1].group(1) if dated else None
+        if aggregation in ('latest', 'previous'):
+            position = -1 if aggregation == 'latest' else -2
+            period = series.index[position]
+            return (score, f"**{line_item}** ({period}, {self.source_label} *{sheet_name}*): {value}",
+                    newest, f"{line_item.lower()}|{column_years[position].group(1)}|{value}")
+        line = f"**{_label(aggregation, line_item)}** ({self.source_label} *{sheet_name}*): {value}"
+        return score, line, newest, line
+
+    def _aggregate(self, series: pd.Series, aggregation: str) -> Optional[str]:
+        if aggregation == 'latest':
+            return _format_value(series.iloc[-1])
+        if aggregation == 'previous':
+            return _format_value(series.iloc[-2]) if len(series) > 1 else None
+        if aggregation == 'growth':
+            if len(series) < 2:
+                return None
+            first, last = series.iloc[0], series.iloc[-1]
+            change = last - first
+            if first == 0:
+                return f"{_format_value(first)} → {_format_value(last)} (change {_format_value(change)})"
+            return (f"{_format_value(first)} → {_format_value(last)} "
+                    f"({change / abs(first) * 100:+.1f}%)")
+        return _format_value(series.agg(aggregation))
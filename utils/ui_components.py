@@ -1,6 +1,14 @@
 import streamlit as st
 import time
 from typing import Dict, Any
+from utils.corpus import CORPUS_ID_PATTERN, CorpusError, DocumentCorpus, get_corpus, new_corpus_id
+from utils.ingest import IngestJob
+from utils.metrics import get_metrics
+from utils.vector_index import EmbeddingError
+from utils.warmup import WarmupJob
+
+# Messages shown per page of chat history, older pages load on request
+CHAT_PAGE_SIZE = 20
 
 def render_left_sidebar():
     with st.sidebar:
@@ -24,10 +32,22 @@ def render_left_sidebar():
             st.markdown('**Model**: gemma:2b not found')
             st.warning("Run: ollama pull gemma:2b")
         
+        router = st.session_state.qa_engine.router
+        if len(router.nodes) > 1:
+            nodes = router.status() or {}
+            generating = sum(node['outstanding'] for node in router.load())
+            st.caption(f"Ollama nodes: {nodes.get('nodes_online', 0)}/{len(router.nodes)} online, "
+                       f"{generating} generating")
+        
+        cache_stats = st.session_state.qa_engine.answer_cache.stats()
+        st.caption(f"Answer cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Document information
-        if st.session_state.document_uploaded:
+        if st.session_state.get('corpus_mode'):
+            render_corpus_info()
+        elif st.session_state.document_uploaded:
             st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
             st.markdown("### Document Info")
             
@@ -40,6 +60,10 @@ def render_left_sidebar():
                     st.write(f"**Pages**: {metadata.get('pages', 0)}")
                 elif metadata.get('file_type') == 'Excel':
                     st.write(f"**Sheets**: {metadata.get('sheet_count', 0)}")
+                    for sheet_name, rows in metadata.get('truncated_sheets', {}).items():
+                        st.caption(f"Sheet '{sheet_name}' exceeded the memory limit, first "
+                                   f"{rows['loaded_rows']:,} of {rows['total_rows']:,} rows loaded; "
+                                   f"its summary covers every row")
                 
                 # Show file size in readable format
                 size_bytes = metadata.get('file_size', 0)
@@ -53,29 +77,225 @@ def render_left_sidebar():
             
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # Retrieval mode
+        st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
+        st.markdown("### Retrieval")
+        st.toggle(
+            "Corpus mode",
+            key="corpus_mode",
+            help="Ask questions across several documents at once; the corpus is kept between sessions under this page's URL"
+        )
+        st.radio(
+            "Context source",
+            options=["keyword", "semantic"],
+            format_func=lambda mode: "Keyword (BM25)" if mode == "keyword" else "Semantic (embeddings)",
+            key="retrieval_mode",
+            disabled=st.session_state.get('corpus_mode', False),
+            help="Semantic mode embeds the document with the local Ollama embedding model"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+        
         # Controls section
         st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
         st.markdown("### Controls")
         
         if st.button("Clear Chat History", use_container_width=True, key="clear_chat"):
             st.session_state.messages = []
+            st.session_state.chat_pages = 1
             st.session_state.qa_engine.clear_history()
             st.rerun()
         
-        if st.session_state.document_uploaded:
+        if st.session_state.get('corpus_mode'):
+            if len(session_corpus()) and st.button("Clear Corpus", use_container_width=True, key="clear_corpus"):
+                session_corpus().clear()
+                st.session_state.corpus_uploads = set()
+                st.session_state.messages = []
+                st.session_state.chat_pages = 1
+                st.session_state.qa_engine.clear_history()
+                st.rerun()
+        elif st.session_state.document_uploaded:
             if st.button("Upload New Document", use_container_width=True, key="new_doc"):
+                if st.session_state.get('ingest_job') is not None:
+                    st.session_state.ingest_job.cancel()
+                    st.session_state.ingest_job = None
+                if st.session_state.get('warmup_job') is not None:
+                    st.session_state.warmup_job.cancel()
+                    st.session_state.warmup_job = None
                 st.session_state.document_uploaded = False
                 st.session_state.document_content = ""
+                st.session_state.document_index = None
+                st.session_state.document_insights = None
                 st.session_state.messages = []
+                st.session_state.chat_pages = 1
                 st.session_state.qa_engine.clear_history()
                 st.rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
         
+        # Performance metrics
+        if st.toggle("Show performance metrics", key="show_metrics"):
+            render_metrics_panel()
+        
         # Sample questions
-        if st.session_state.document_uploaded:
+        if st.session_state.get('corpus_mode'):
+            if len(session_corpus()):
+                render_sample_questions()
+        elif st.session_state.document_uploaded:
             render_sample_questions()
 
+def render_metrics_panel():
+    """Per-stage latency percentiles and token throughput, with Prometheus/JSON export"""
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+    st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
+    st.markdown("### Performance")
+    
+    rows = []
+    for histogram in snapshot['histograms']:
+        labels = histogram['labels']
+        if histogram['metric'] == 'stage_seconds':
+            name, unit = labels['stage'], "s"
+        else:
+            name, unit = f"{labels.get('phase', '')} tokens/s", ""
+        rows.append({
+            'stage': name,
+            'count': histogram['count'],
+            'p50': f"{histogram['p50']:.3f}{unit}",
+            'p95': f"{histogram['p95']:.3f}{unit}",
+            'p99': f"{histogram['p99']:.3f}{unit}",
+        })
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    else:
+        st.caption("No timings recorded yet")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Prometheus", metrics.to_prometheus(), file_name="metrics.prom",
+                           mime="text/plain", use_container_width=True, key="metrics_prometheus")
+    with col2:
+        st.download_button("JSON", metrics.to_json(), file_name="metrics.json",
+                           mime="application/json", use_container_width=True, key="metrics_json")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def session_corpus() -> DocumentCorpus:
+    """This session's corpus; its id is kept in the URL so a reload or bookmark returns to it"""
+    corpus_id = st.query_params.get('corpus')
+    if not corpus_id or not CORPUS_ID_PATTERN.fullmatch(corpus_id):
+        corpus_id = new_corpus_id()
+        st.query_params['corpus'] = corpus_id
+    corpus = st.session_state.get('corpus')
+    if corpus is None or st.session_state.get('corpus_id') != corpus_id:
+        # Held in the session so the shared instance stays open while this session uses it
+        corpus = st.session_state.corpus = get_corpus(corpus_id)
+        st.session_state.corpus_id = corpus_id
+        st.session_state.corpus_uploads = set()
+    return corpus
+
+def render_corpus_info():
+    corpus = session_corpus()
+    st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
+    st.markdown("### Corpus")
+    documents = corpus.documents()
+    if not documents:
+        st.caption("No documents in the corpus yet")
+    for entry in documents:
+        st.write(f"**{entry['filename']}** ({entry['file_type']}, {format_file_size(entry['file_size'])})")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_corpus_center():
+    """Upload several documents into the persistent corpus and chat across all of them"""
+    corpus = session_corpus()
+    with st.expander("Add documents to the corpus", expanded=not len(corpus)):
+        uploaded_files = st.file_uploader(
+            "Choose financial documents",
+            type=['pdf', 'xlsx', 'xls'],
+            accept_multiple_files=True,
+            help="Each document is indexed once and kept in the corpus",
+            label_visibility="collapsed",
+            key="corpus_uploader"
+        )
+        
+        processor = st.session_state.document_processor
+        seen = st.session_state.setdefault('corpus_uploads', set())
+        for uploaded_file in uploaded_files or []:
+            upload_id = (uploaded_file.name, uploaded_file.size)
+            if upload_id in seen:
+                continue
+            seen.add(upload_id)
+            if not processor.validate_file(uploaded_file):
+                continue
+            try:
+                # Only the new document is parsed and indexed, existing shards are untouched
+                with st.spinner(f"Indexing {uploaded_file.name}..."):
+                    corpus.add_document(processor, uploaded_file)
+            except CorpusError as e:
+                st.error(str(e))
+    
+    if len(corpus):
+        render_chat_interface()
+    else:
+        st.info("Upload one or more financial documents to start asking questions across them.")
+
+def active_document() -> Dict[str, Any]:
+    """Text, tables and cache id of whatever the chat answers from: one document or the corpus"""
+    if st.session_state.get('corpus_mode'):
+        corpus = session_corpus()
+        return {'content': corpus.overview(), 'tables': None, 'document_id': corpus.fingerprint()}
+    metadata = st.session_state.get('document_metadata', {})
+    return {
+        'content': st.session_state.document_content,
+        'tables': metadata.get('tables'),
+        'document_id': metadata.get('content_hash', '')
+    }
+
+def build_document_insights(document_id: str, content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Everything the sidebar and summary derive from the document text, computed in one go"""
+    insights = {
+        'document_id': document_id,
+        'sample_questions': st.session_state.qa_engine.generate_sample_questions(content)[:5],
+        'summary': "",
+        'metric_lines': [],
+    }
+    if not metadata:
+        return insights
+
+    insights['summary'] = st.session_state.document_processor.get_document_summary(content, metadata)
+    metrics = metadata.get('extracted_metrics') or {}
+    first_values = {}
+    for record in metadata.get('metric_values', []):
+        if record['value'] is not None:
+            first_values.setdefault(record['keyword'], record)
+    for term, values in metrics.items():
+        if term != 'years' and values:
+            line = f"- **{term.title()}**: {len(values)} occurrences"
+            record = first_values.get(term)
+            if record:
+                amount = f"{record['value']:,.2f}"
+                if record['currency']:
+                    amount += f" {record['currency']}"
+                if record['page']:
+                    amount += f", page {record['page']}"
+                line += f" (first: {amount})"
+            insights['metric_lines'].append(line)
+    if 'years' in metrics:
+        insights['metric_lines'].append(f"- **Years**: {', '.join(metrics['years'])}")
+    return insights
+
+def document_insights() -> Dict[str, Any]:
+    """Derived state for the active document, rebuilt only when the document (or corpus) changes"""
+    insights = st.session_state.get('document_insights')
+    if st.session_state.get('corpus_mode'):
+        document_id = session_corpus().fingerprint()
+    else:
+        document_id = st.session_state.get('document_metadata', {}).get('content_hash', '')
+    if insights is None or insights['document_id'] != document_id:
+        document = active_document()
+        metadata = None if st.session_state.get('corpus_mode') else st.session_state.get('document_metadata')
+        insights = build_document_insights(document_id, document['content'], metadata)
+        st.session_state.document_insights = insights
+    return insights
+
 def render_file_upload_center():
     st.markdown('<div class="file-upload-container">Upload your file below.</div>', unsafe_allow_html=True)
     
@@ -87,53 +307,196 @@ def render_file_upload_center():
         key="file_uploader"
     )
     
-    if uploaded_file is not None and not st.session_state.document_uploaded:
+    if st.session_state.processing_status:
+        st.error(st.session_state.processing_status)
+    
+    upload_id = (uploaded_file.name, uploaded_file.size) if uploaded_file is not None else None
+    if (uploaded_file is not None and not st.session_state.document_uploaded
+            and st.session_state.get('ingest_job') is None
+            and upload_id != st.session_state.get('failed_upload_id')):
         if st.session_state.document_processor.validate_file(uploaded_file):
-            with st.spinner("Processing document..."):
-                try:
-                    content, metadata = st.session_state.document_processor.process_document(uploaded_file)
-                    if content:
-                        st.session_state.document_content = content
-                        st.session_state.document_metadata = metadata
-                        st.session_state.document_uploaded = True
-                        st.success("Document processed successfully!")
-                        time.sleep(1)
-                        st.rerun()
-                    else:
-                        st.error("Failed to extract content from document")
-                except Exception as e:
-                    st.error(f"Error processing document: {str(e)}")
+            # Parse in the background; the chat opens as soon as the first pages are indexed
+            st.session_state.processing_status = ""
+            st.session_state.pop('document_metadata', None)
+            st.session_state.ingest_job = IngestJob(st.session_state.document_processor, uploaded_file).start()
+            st.session_state.ingest_upload_id = upload_id
+    
+    if st.session_state.get('ingest_job') is not None:
+        render_ingest_progress()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+@st.fragment(run_every=1.0)
+def render_ingest_progress():
+    job = st.session_state.get('ingest_job')
+    if job is None:
+        return
+    
+    if job.error is not None:
+        st.session_state.ingest_job = None
+        st.session_state.document_uploaded = False
+        st.session_state.processing_status = f"Error processing document: {job.error}"
+        st.session_state.failed_upload_id = st.session_state.get('ingest_upload_id')
+        st.rerun()
+    elif job.finished:
+        if job.content():
+            finish_ingest(job)
+        else:
+            st.session_state.ingest_job = None
+            st.session_state.document_uploaded = False
+            st.session_state.processing_status = "Failed to extract content from document"
+            st.session_state.failed_upload_id = st.session_state.get('ingest_upload_id')
+        st.rerun()
+    elif job.ready and not st.session_state.document_uploaded:
+        # Enough is indexed to start answering questions
+        st.session_state.document_uploaded = True
+        st.rerun()
+    else:
+        st.progress(
+            job.progress,
+            text=f"Processing {job.filename}... {job.completed}/{job.total or '?'} sections indexed"
+        )
+
+def finish_ingest(job: IngestJob):
+    """Promote a completed background ingest to the session's document"""
+    st.session_state.document_content = job.content()
+    st.session_state.document_metadata = job.metadata
+    st.session_state.document_index = job.index
+    st.session_state.document_index_mode = "keyword"
+    st.session_state.ingest_job = None
+    st.session_state.document_uploaded = True
+    st.session_state.document_insights = build_document_insights(
+        job.metadata.get('content_hash', ''), st.session_state.document_content, job.metadata
+    )
+
+    cache = st.session_state.document_processor.cache
+    key = job.metadata.get('content_hash')
+    if cache is not None and key:
+        try:
+            cache.store(key, 'bm25', job.index)
+        except OSError:
+            pass
+
+    start_warmup()
+
+def start_warmup():
+    """Pre-generate answers for the suggested questions while the user reads the document"""
+    if st.session_state.get('warmup_job') is not None:
+        st.session_state.warmup_job.cancel()
+
+    st.session_state.warmup_job = WarmupJob(
+        st.session_state.qa_engine,
+        document_insights()['sample_questions'],
+        st.session_state.document_content,
+        retriever=ensure_document_index(),
+        document_id=st.session_state.document_metadata.get('content_hash', '')
+    ).start()
+
+def ensure_document_index():
+    """Build (or rebuild after a mode switch) the retrieval index for the loaded document"""
+    # Answer against the pages indexed so far while a document is still parsing
+    if st.session_state.get('ingest_job') is not None:
+        return st.session_state.ingest_job
+
+    mode = st.session_state.get('retrieval_mode', 'keyword')
+    if st.session_state.get('document_index') is not None and st.session_state.get('document_index_mode') == mode:
+        return st.session_state.document_index
+
+    qa_engine = st.session_state.qa_engine
+    cache = st.session_state.document_processor.cache
+    key = st.session_state.get('document_metadata', {}).get('content_hash')
+    if mode == "keyword" and cache is not None and key:
+        # Keyword indexes are cached next to the parsed document
+        index = cache.load(key, 'bm25')
+        if index is not None:
+            st.session_state.document_index = index
+            st.session_state.document_index_mode = mode
+            return index
+
+    try:
+        with st.spinner("Indexing document..."):
+            index = qa_engine.build_retriever(st.session_state.document_content, mode)
+            if mode == "keyword" and cache is not None and key:
+                try:
+                    cache.store(key, 'bm25', index)
+                except OSError:
+                    pass
+    except EmbeddingError as e:
+        # Keep the requested mode recorded so the fallback is not retried on every question
+        st.warning(f"Semantic index unavailable, using keyword retrieval: {str(e)}")
+        index = qa_engine.build_retriever(st.session_state.document_content, "keyword")
+
+    st.session_state.document_index = index
+    st.session_state.document_index_mode = mode
+    return index
+
 def render_sample_questions():
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown("### Sample Questions")
     
-    # Generate sample questions
-    sample_questions = st.session_state.qa_engine.generate_sample_questions(
-        st.session_state.document_content
-    )
+    # Computed once per document, not on every rerun
+    sample_questions = document_insights()['sample_questions']
     
-    for i, question in enumerate(sample_questions[:5]):  # Show only 5
+    for i, question in enumerate(sample_questions):
         if st.button(
             f"{question}",
             key=f"sample_q_{i}",
             use_container_width=True,
             help="Click to ask this question"
         ):
-            # Add question to chat
-            st.session_state.messages.append({"role": "user", "content": question})
+            # Ask it through the chat on the next run
+            st.session_state.pending_question = question
             st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
 def render_chat_interface():
+    corpus_mode = st.session_state.get('corpus_mode', False)
+    if not corpus_mode and st.session_state.get('ingest_job') is not None:
+        render_ingest_progress()
+    
+    render_chat()
+
+def message_html(message: Dict[str, Any]) -> str:
+    # Built once per message and kept with it, reruns only join the strings
+    html = message.get('html')
+    if html is None:
+        if message["role"] == "user":
+            html = f'<div class="user-message">👤 {message["content"]}</div>'
+        else:
+            html = f'<div class="assistant-message">🤖 {message["content"]}</div>'
+        message['html'] = html
+    return html
+
+def show_earlier_messages():
+    st.session_state.chat_pages = st.session_state.get('chat_pages', 1) + 1
+
+def render_chat_history():
+    """The latest page of messages as a single element, with a button to page back"""
+    messages = st.session_state.messages
+    pages = st.session_state.get('chat_pages', 1)
+    hidden = len(messages) - pages * CHAT_PAGE_SIZE
+    if hidden > 0:
+        st.button(f"Show earlier messages ({hidden} more)", key="chat_earlier", on_click=show_earlier_messages)
+    
+    shown = messages[-pages * CHAT_PAGE_SIZE:]
+    if shown:
+        st.markdown(''.join(message_html(message) for message in shown), unsafe_allow_html=True)
+
+@st.fragment
+def render_chat():
+    """History, input and the answer being generated; a question reruns only this fragment"""
+    corpus_mode = st.session_state.get('corpus_mode', False)
+    
     # Show document status
-    st.markdown("""
+    if corpus_mode:
+        status_text = f"{len(session_corpus())} documents loaded and ready for questions!"
+    else:
+        status_text = "Document loaded and ready for questions!"
+    st.markdown(f"""
     <div style="background: #dcfce7; border: 1px solid #16a34a; border-radius: 8px; padding: 12px; margin-bottom: 20px;">
         <span class="status-indicator status-online"></span>
-        <strong>Document loaded and ready for questions!</strong>
+        <strong>{status_text}</strong>
     </div>
     """, unsafe_allow_html=True)
     
@@ -141,67 +504,74 @@ def render_chat_interface():
     chat_container = st.container()
     
     with chat_container:
-        # Display chat messages
-        for message in st.session_state.messages:
-            if message["role"] == "user":
-                st.markdown(
-                    f'<div class="user-message">👤 {message["content"]}</div>',
-                    unsafe_allow_html=True
-                )
-            else:
-                st.markdown(
-                    f'<div class="assistant-message">🤖 {message["content"]}</div>',
-                    unsafe_allow_html=True
-                )
+        render_chat_history()
     
     # Chat input
-    if prompt := st.chat_input("Ask a question about your financial document..."):
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+    typed = st.chat_input("Ask a question about your financial document...")
+    if prompt := typed or st.session_state.pop('pending_question', None):
+        # Add user message to chat history and display it immediately
+        message = {"role": "user", "content": prompt}
+        st.session_state.messages.append(message)
+        st.markdown(message_html(message), unsafe_allow_html=True)
+        
+        qa_engine = st.session_state.qa_engine
+        document = active_document()
+        # The corpus is its own (sharded keyword) index
+        retriever = session_corpus() if corpus_mode else ensure_document_index()
+        
+        # Get conversation context
+        context = qa_engine.get_conversation_context()
         
-        # Display user message immediately
-        st.markdown(
-            f'<div class="user-message">👤 {prompt}</div>',
+        # Render tokens as they arrive instead of waiting for the full answer
+        placeholder = st.empty()
+        placeholder.markdown(
+            '<div class="assistant-message">🤖 Analyzing document and generating response...</div>',
             unsafe_allow_html=True
         )
         
-        # Show typing indicator
-        with st.spinner("🤖 Analyzing document and generating response..."):
-            # Get conversation context
-            context = st.session_state.qa_engine.get_conversation_context()
-            
-            # Generate response
-            response = st.session_state.qa_engine.generate_response(
-                prompt,
-                st.session_state.document_content,
-                context
+        def show_queue_position(position: int, eta: float):
+            placeholder.markdown(
+                f'<div class="assistant-message">🤖 Waiting for the model: position {position} in the queue, '
+                f'about {eta:.0f}s...</div>',
+                unsafe_allow_html=True
             )
-            
-            # Add assistant response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            
-            # Rerun to show the new message
-            st.rerun()
+        
+        streamed = ""
+        last_render = 0.0
+        for delta in qa_engine.stream_response(
+            prompt,
+            document['content'],
+            context,
+            retriever=retriever,
+            tables=document['tables'],
+            document_id=document['document_id'],
+            on_wait=show_queue_position
+        ):
+            streamed += delta
+            # Throttle redraws so long answers don't flood the websocket
+            if time.monotonic() - last_render > 0.05:
+                placeholder.markdown(
+                    f'<div class="assistant-message">🤖 {streamed}▌</div>',
+                    unsafe_allow_html=True
+                )
+                last_render = time.monotonic()
+        
+        # Add the post-processed assistant response to chat history and show it in place;
+        # the next run picks it up from the history without redrawing anything else
+        message = {"role": "assistant", "content": qa_engine.last_answer}
+        st.session_state.messages.append(message)
+        placeholder.markdown(message_html(message), unsafe_allow_html=True)
 
 def render_document_summary():
     if st.session_state.document_uploaded and hasattr(st.session_state, 'document_metadata'):
         with st.expander("Document Summary", expanded=False):
-            summary = st.session_state.document_processor.get_document_summary(
-                st.session_state.document_content,
-                st.session_state.document_metadata
-            )
-            st.text(summary)
+            insights = document_insights()
+            st.text(insights['summary'])
             
             # Show extracted financial metrics if available
-            metadata = st.session_state.document_metadata
-            if 'extracted_metrics' in metadata and metadata['extracted_metrics']:
+            if insights['metric_lines']:
                 st.markdown("**Financial Terms Found:**")
-                metrics = metadata['extracted_metrics']
-                for term, values in metrics.items():
-                    if term != 'years' and values:
-                        st.write(f"- **{term.title()}**: {len(values)} occurrences")
-                if 'years' in metrics:
-                    st.write(f"- **Years**: {', '.join(metrics['years'])}")
+                st.markdown("\n".join(insights['metric_lines']))
 
 def show_error_message(error_type: str, message: str):
     error_styles = {
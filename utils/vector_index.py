@@ -0,0 +1,122 @@
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+from utils.ollama_client import OllamaClient
+from utils.retriever import Retriever, chunk_document
+from utils.storage import content_hash, get_cache_dir
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+class OllamaEmbedder:
+    def __init__(self, model_name: str = "nomic-embed-text", ollama_url: str = "http://localhost:11434",
+                 timeout: int = 60, client: Optional[OllamaClient] = None):
+        self.model_name = model_name
+        self.ollama_url = ollama_url
+        self.timeout = timeout
+        self.client = client or OllamaClient(ollama_url)
+
+    def embed(self, text: str) -> List[float]:
+        try:
+            response = self.client.post(
+                "/api/embeddings",
+                {"model": self.model_name, "prompt": text},
+                read_timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise EmbeddingError(f"Failed to reach Ollama embeddings endpoint: {str(e)}")
+
+        if response.status_code != 200:
+            raise EmbeddingError(f"Ollama returned status code {response.status_code} for embeddings")
+
+        embedding = response.json().get('embedding')
+        if not embedding:
+            raise EmbeddingError(f"Model '{self.model_name}' returned an empty embedding")
+        return embedding
+
+
+class EmbeddingCache:
+    """On-disk store of normalised chunk embedding matrices keyed by content hash and model"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or get_cache_dir('embeddings')
+
+    def path_for(self, key: str, model_name: str) -> str:
+        model_dir = os.path.join(self.cache_dir, model_name.replace(':', '_').replace('/', '_'))
+        os.makedirs(model_dir, exist_ok=True)
+        return os.path.join(model_dir, f"{key}.npy")
+
+    def load(self, key: str, model_name: str) -> Optional[np.ndarray]:
+        path = self.path_for(key, model_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            # Memory-map so large corpora are paged in on demand
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            os.remove(path)
+            return None
+
+    def store(self, key: str, model_name: str, matrix: np.ndarray) -> np.ndarray:
+        path = self.path_for(key, model_name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+
+class VectorRetriever(Retriever):
+    """Semantic retrieval over chunk embeddings using cosine similarity"""
+
+    def __init__(self, chunks: List[Dict[str, Any]], embedder: OllamaEmbedder,
+                 cache: Optional[EmbeddingCache] = None):
+        self.chunks = chunks
+        self.embedder = embedder
+        self.cache = cache or EmbeddingCache()
+        self.key = content_hash(*[chunk['text'] for chunk in chunks])
+        self.matrix = self._load_or_build()
+
+    @classmethod
+    def from_document(cls, document_content: str, embedder: OllamaEmbedder,
+                      cache: Optional[EmbeddingCache] = None, max_chunk_chars: int = 1200) -> 'VectorRetriever':
+        return cls(chunk_document(document_content, max_chunk_chars), embedder, cache)
+
+    def _load_or_build(self) -> np.ndarray:
+        matrix = self.cache.load(self.key, self.embedder.model_name)
+        if matrix is not None and matrix.shape[0] == len(self.chunks):
+            return matrix
+
+        if not self.chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        rows = [self.embedder.embed(chunk['text']) for chunk in self.chunks]
+        matrix = np.asarray(rows, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        return self.cache.store(self.key, self.embedder.model_name, matrix)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if not self.chunks:
+            return []
+
+        query_vector = np.asarray(self.embedder.embed(query), dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm == 0 or query_vector.shape[0] != self.matrix.shape[1]:
+            return []
+        query_vector /= query_norm
+
+        scores = self.matrix @ query_vector
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        return [dict(self.chunks[i], score=float(scores[i])) for i in best]
@@ -0,0 +1,144 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from utils.answer_cache import AnswerCache
+from utils.retriever import Retriever
+
+
+class ForegroundGate:
+    """Counts in-flight user questions so background generation can yield the model"""
+
+    def __init__(self):
+        self._active = 0
+        self._background = set()
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def foreground(self):
+        with self._condition:
+            self._active += 1
+            aborts = list(self._background)
+        # Cut background generations off now, one still in prompt evaluation
+        # would otherwise hold the model until its first token
+        for abort in aborts:
+            abort()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def background(self, abort: Callable[[], None]):
+        """Register a background generation; ``abort`` is called once a user question arrives"""
+        with self._condition:
+            self._background.add(abort)
+            busy = self._active > 0
+        if busy:
+            abort()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._background.discard(abort)
+
+    def busy(self) -> bool:
+        return self._active > 0
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self._active == 0, timeout)
+
+
+_gate = ForegroundGate()
+
+
+def get_foreground_gate() -> ForegroundGate:
+    return _gate
+
+
+class WarmupJob:
+    """Pre-generates answers for suggested questions into the shared answer cache.
+
+    Runs on a daemon thread, only while no user question is in flight. A
+    user question cuts the running generation off through the gate (which
+    stops Ollama, even mid prompt evaluation) and it is retried once the
+    model is idle again. Answers
+    are stored under ``AnswerCache.sample_key`` so a click hits them
+    whatever the conversation holds by then.
+    """
+
+    def __init__(self, qa_engine, questions: List[str], document_content: str,
+                 retriever: Optional[Retriever] = None, document_id: str = ""):
+        # A private engine keeps warm-up answers out of the user's conversation history
+        self.engine = qa_engine.__class__(
+            model_name=qa_engine.model_name,
+            ollama_url=qa_engine.ollama_url,
+            max_context_chars=qa_engine.max_context_chars,
+            embedding_model=qa_engine.embedding_model,
+            client=qa_engine.client,
+            answer_cache=qa_engine.answer_cache,
+            keep_alive=qa_engine.keep_alive,
+            num_ctx=qa_engine.num_ctx,
+            scheduler=qa_engine.scheduler,
+            router=qa_engine.router
+        )
+        self.engine.background = True
+        self.questions = list(questions)
+        self.document_content = document_content
+        self.retriever = retriever
+        self.document_id = document_id
+        self.completed = []
+        self.gate = get_foreground_gate()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'WarmupJob':
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def finished(self) -> bool:
+        return not self._thread.is_alive()
+
+    def _run(self):
+        pending = list(self.questions)
+        while pending and not self._cancelled.is_set():
+            # Poll so cancellation is noticed even while users keep the model busy
+            if not self.gate.wait_idle(timeout=1.0):
+                continue
+
+            question = pending[0]
+            outcome = self._generate(question)
+            if outcome == 'error':
+                # Ollama unavailable, the user path will report it
+                return
+            if outcome == 'done':
+                pending.pop(0)
+                self.completed.append(question)
+
+    def _generate(self, question: str) -> str:
+        self.engine.clear_history()
+        stream = self.engine.stream_response(
+            question, self.document_content, "", retriever=self.retriever, document_id=self.document_id
+        )
+        try:
+            for _ in stream:
+                if self._cancelled.is_set() or self.gate.busy():
+                    return 'interrupted'
+        finally:
+            stream.close()
+
+        if self.engine.last_answer == self.engine.INTERRUPTED_ERROR:
+            return 'interrupted'
+        if self.engine.last_answer.startswith("❌"):
+            return 'error'
+        self.engine.answer_cache.put(
+            AnswerCache.sample_key(self.document_id, self.engine.model_name, question), self.engine.last_answer
+        )
+        return 'done'